@@ -65,10 +65,21 @@ class TurnOffViewsDatasetNormal(MultiomicDatasetNormal):
                                     #  32:['methyl', 'rna']
                                      32:['methyl', 'mirna', 'rna']
                             }
+        self._views_turned_off_per_label = np.zeros((len(self.dict_cancer_to_views), len(self.views)), dtype=bool)
+        for label, views_turned_off in self.dict_cancer_to_views.items():
+            self._views_turned_off_per_label[label, [self._dict_of_the_combinations[el] for el in views_turned_off]] = True
+
+    def __getitems__(self, indices):
+        indices = np.asarray(indices)
+        data, original_mask = self.fetch_batch(indices)
+        mask = original_mask & ~self._views_turned_off_per_label[self.all_patient_labels[indices]]
+        return self.collated_batch((data, mask, original_mask), indices)
+
     def __getitem__(self, idx): 
+        if isinstance(idx, (list, np.ndarray)): return self.__getitems__(idx)
         patient_name = self.all_patient_names[idx]
         patient_label = self.all_patient_labels[idx]
-        data = np.zeros((len(self.views), self.nb_features)) # nombre_views X nombre_features
+        data = np.zeros((len(self.views), self.nb_features), dtype=self.dtype) # nombre_views X nombre_features
         for i, view in enumerate(self.views):
             if patient_name in view['patient_names']:
                 try:
@@ -77,7 +88,7 @@ class TurnOffViewsDatasetNormal(MultiomicDatasetNormal):
                     data[i][:view['data'][view['patient_names'].get(patient_name, 0)].shape[0]] = view['data'][view['patient_names'].get(patient_name, 0)]
         mask = np.array([(patient_name in view['patient_names']) for view in self.views])
         original_mask = deepcopy(mask)
-        original_data = data.astype(float)
+        original_data = data
         for el in self.dict_cancer_to_views[patient_label]: mask[self._dict_of_the_combinations[el]] = False
         return (original_data, mask, original_mask), patient_label, patient_name
 
@@ -98,18 +109,8 @@ class TestMOTOnSamplesWithAllExamples:
     
     def build_set_of_potential_patients_targets(self, nb_views_per_patients: int = 5) -> list:
         assert nb_views_per_patients in [1,2,3,4,5], f'We should have 1,2,3,4 or 5 combined view per patients. This {nb_views_per_patients} is not correct'
-        temporaire_dict = defaultdict(dict)
-        for patient_name in self.dataset.all_patient_names:
-            cpt = 0; list_of_omics_per_patients = []
-            if patient_name in self.dataset.views[0]['patient_names']: cpt+=1; list_of_omics_per_patients.append('c')
-            if patient_name in self.dataset.views[1]['patient_names']: cpt+=1; list_of_omics_per_patients.append('me')
-            if patient_name in self.dataset.views[2]['patient_names']: cpt+=1; list_of_omics_per_patients.append('mi')
-            if patient_name in self.dataset.views[3]['patient_names']: cpt+=1; list_of_omics_per_patients.append('r')
-            if patient_name in self.dataset.views[4]['patient_names']: cpt+=1; list_of_omics_per_patients.append('p')
-            temporaire_dict[patient_name] = [cpt, list_of_omics_per_patients]
-        values_temporaire_dict = np.asarray(list(temporaire_dict.values()))
-        list_patients_with_nb_views = [patient_name for patient_name, value in temporaire_dict.items() if value[0] == nb_views_per_patients]
-        return list_patients_with_nb_views
+        index = self.dataset.patient_view_index
+        return list(index.patient_names[index.query(nb_views=nb_views_per_patients)])
     
     def initialisation(self, 
                        config_file: str = '', 
@@ -119,15 +120,8 @@ class TestMOTOnSamplesWithAllExamples:
         self.dataset = MultiomicDatasetNormal(data_size=data_size, views_to_consider=dataset_views_to_consider)
         _, new_test, _ = MultiomicDatasetBuilder.multiomic_data_normal_builder(dataset=self.dataset, test_size=0.2, valid_size=0.1, random_state=random_state)
         self.list_patients_with_nb_views = self.build_set_of_potential_patients_targets(nb_views_per_patients=self.number_of_view_to_consider)
-        position_test_set_indices_to_retain = []
-        patients_name_to_retain = []
-        for idx in range(len(new_test.indices)):
-            original_mask_patient_in_test_set = new_test[idx][0][-1]
-            original_patient_name = new_test[idx][2]
-            if sum(original_mask_patient_in_test_set) == self.number_of_view_to_consider and original_patient_name in self.list_patients_with_nb_views: 
-                if original_patient_name not in patients_name_to_retain:
-                    position_test_set_indices_to_retain.append(idx)
-                    patients_name_to_retain.append(original_patient_name)
+        # positions in the test set of the patients with number_of_view_to_consider views, read from the index (no sample is loaded)
+        position_test_set_indices_to_retain = self.dataset.patient_view_index.positions(new_test.indices, nb_views=self.number_of_view_to_consider)
         old_indices = deepcopy(new_test.indices)
         self.new_test_indices = list(np.asarray(old_indices)[position_test_set_indices_to_retain])
         print(f'Length Original test set : {len(old_indices)} \n Length Test set with all 5 omics present: {len(self.new_test_indices)}')
@@ -230,10 +224,18 @@ class DatasetWithOnly3omicsWithMissingOmics(MultiomicDatasetNormal):
                  ):
         super().__init__(data_size=data_size, views_to_consider=views_to_consider)
 
+    def __getitems__(self, indices):
+        indices = np.asarray(indices)
+        data, original_mask = self.fetch_batch(indices)
+        mask = original_mask.copy()
+        mask[:, [0, 4]] = False # we put cnv and protein at 0 no matter what
+        return self.collated_batch((data, mask, original_mask), indices)
+
     def __getitem__(self, idx): 
+        if isinstance(idx, (list, np.ndarray)): return self.__getitems__(idx)
         patient_name = self.all_patient_names[idx]
         patient_label = self.all_patient_labels[idx]
-        data = np.zeros((len(self.views), self.nb_features)) # nombre_views X nombre_features
+        data = np.zeros((len(self.views), self.nb_features), dtype=self.dtype) # nombre_views X nombre_features
         for i, view in enumerate(self.views):
             if patient_name in view['patient_names']:
                 try:
@@ -242,7 +244,7 @@ class DatasetWithOnly3omicsWithMissingOmics(MultiomicDatasetNormal):
                     data[i][:view['data'][view['patient_names'].get(patient_name, 0)].shape[0]] = view['data'][view['patient_names'].get(patient_name, 0)]
         mask = np.array([(patient_name in view['patient_names']) for view in self.views])
         original_mask = deepcopy(mask)
-        original_data = data.astype(float)
+        original_data = data
         mask[[0, 4]] = False # we put cnv and protein at 0 no matter what
         return (original_data, mask, original_mask), patient_label, patient_name
         
@@ -253,10 +255,18 @@ class DatasetWithOnlyRNAWithMissingOmics(MultiomicDatasetNormal):
                  ):
         super().__init__(data_size=data_size, views_to_consider=views_to_consider)
 
+    def __getitems__(self, indices):
+        indices = np.asarray(indices)
+        data, original_mask = self.fetch_batch(indices)
+        mask = original_mask.copy()
+        mask[:, [0, 1, 2, 4]] = False
+        return self.collated_batch((data, mask, original_mask), indices)
+
     def __getitem__(self, idx): 
+        if isinstance(idx, (list, np.ndarray)): return self.__getitems__(idx)
         patient_name = self.all_patient_names[idx]
         patient_label = self.all_patient_labels[idx]
-        data = np.zeros((len(self.views), self.nb_features)) # nombre_views X nombre_features
+        data = np.zeros((len(self.views), self.nb_features), dtype=self.dtype) # nombre_views X nombre_features
         for i, view in enumerate(self.views):
             if patient_name in view['patient_names']:
                 try:
@@ -265,7 +275,7 @@ class DatasetWithOnlyRNAWithMissingOmics(MultiomicDatasetNormal):
                     data[i][:view['data'][view['patient_names'].get(patient_name, 0)].shape[0]] = view['data'][view['patient_names'].get(patient_name, 0)]
         mask = np.array([(patient_name in view['patient_names']) for view in self.views])
         original_mask = deepcopy(mask)
-        original_data = data.astype(float)
+        original_data = data
         mask[[0, 1, 2, 4]] = False # we put cnv and protein at 0 no matter what
         return (original_data, mask, original_mask), patient_label, patient_name
         
@@ -286,15 +296,9 @@ class TestMOTOnOnlyThe3MainOMics():
         np.random.seed(self.all_params['seed'])
         torch.manual_seed(self.all_params['seed'])
         self.trainer_model = MultiomicTrainer(Namespace(**self.all_params['model_params']))
-        self.samples_idx_with_all_3_omics = []
-        for idx in range(len(new_test)):
-            # if list(new_test[idx][0][-1]) == [False, True, True, True, False]:
-            if list(new_test[idx][0][-1][1:4]) == [True, True, True]:
-                self.samples_idx_with_all_3_omics.append(idx) # len(samples_idx_with_all_3_omics)== 1742
-        self.samples_idx_with_only_rna_omic = []
-        for idx in range(len(new_test)):
-            if new_test[idx][0][-1][3] == True:
-                self.samples_idx_with_only_rna_omic.append(idx) # len(samples_idx_with_only_rna_omic) 2200
+        index = dataset.patient_view_index
+        self.samples_idx_with_all_3_omics = list(index.positions(new_test.indices, with_views=['methyl', 'mirna', 'rna'])) # len(samples_idx_with_all_3_omics)== 1742
+        self.samples_idx_with_only_rna_omic = list(index.positions(new_test.indices, with_views='rna')) # len(samples_idx_with_only_rna_omic) 2200
                 
     def test_scores(self, 
                     save_file_name: str = 'naive_scores', 
@@ -122,182 +122,39 @@ class ResultsAnalysis:
                                  dataset_views_to_consider: str = '3_main_omics',
                                  seed: int = 42,
                                  output_file: str = 'datasets_reports'): # use the best seed to have the reports for this seed
-        dataset = MultiomicDatasetNormal(data_size=data_size, views_to_consider=dataset_views_to_consider)
+        dataset = MultiomicDatasetNormal(data_size=data_size, views_to_consider=dataset_views_to_consider, lazy_views=True)
         train, test, valid = MultiomicDatasetBuilder().multiomic_data_normal_builder(dataset=dataset, 
                                                                                          test_size=0.2, 
                                                                                          valid_size=0.1, 
                                                                                          random_state=seed)
-        dataset_augmented = MultiomicDatasetDataAug(train_dataset=train, data_size=data_size, views_to_consider=dataset_views_to_consider)
-        train_augmented = MultiomicDatasetBuilder.multiomic_data_aug_builder(augmented_dataset=dataset_augmented)
-        train_data_loader = MultiomicDatasetBuilder().multiomic_dataset_loader(dataset=train, batch_size=len(train))
-        train_augmented_data_loader = MultiomicDatasetBuilder().multiomic_dataset_loader(dataset=train_augmented, batch_size=len(train_augmented))
-        test_data_loader = MultiomicDatasetBuilder().multiomic_dataset_loader(dataset=test, batch_size=len(test))
-        valid_data_loader = MultiomicDatasetBuilder().multiomic_dataset_loader(dataset=valid, batch_size=len(valid))
-        
-        train_masks = next(iter(train_data_loader))[0][1].numpy()
-        train_augmented_masks = next(iter(train_augmented_data_loader))[0][1].numpy()
-        valid_masks = next(iter(valid_data_loader))[0][1].numpy()
-        test_masks = next(iter(test_data_loader))[0][1].numpy()
-        
-        samples_of_train_with_at_least_1_missing_views = 0; samples_of_train_with_1_missing_views = 0; samples_of_train_with_2_missing_views = 0; samples_of_train_with_3_missing_views = 0; samples_of_train_with_4_missing_views = 0
-        samples_of_valid_with_at_least_1_missing_views = 0; samples_of_valid_with_1_missing_views = 0; samples_of_valid_with_2_missing_views = 0; samples_of_valid_with_3_missing_views = 0; samples_of_valid_with_4_missing_views = 0
-        samples_of_test_with_at_least_1_missing_views = 0; samples_of_test_with_1_missing_views = 0; samples_of_test_with_2_missing_views = 0; samples_of_test_with_3_missing_views = 0; samples_of_test_with_4_missing_views = 0
-        
-        samples_of_train_with_missing_views_methyl = 0; samples_of_valid_with_missing_views_methyl = 0; samples_of_test_with_missing_views_methyl = 0
-        samples_of_train_with_missing_views_mirna = 0; samples_of_valid_with_missing_views_mirna = 0; samples_of_test_with_missing_views_mirna = 0 
-        samples_of_train_with_missing_views_rna = 0; samples_of_valid_with_missing_views_rna = 0; samples_of_test_with_missing_views_rna = 0 
-        samples_of_train_with_missing_views_cnv = 0; samples_of_valid_with_missing_views_cnv = 0; samples_of_test_with_missing_views_cnv = 0
-        samples_of_train_with_missing_views_protein = 0; samples_of_valid_with_missing_views_protein = 0; samples_of_test_with_missing_views_protein = 0 
-        
-        samples_of_train_with_all_views = 0; samples_of_valid_with_all_views = 0; samples_of_test_with_all_views = 0; 
-        if dataset_views_to_consider == '3_main_omics':
-            for list_mask in train_masks:
-                position_false = np.where(list_mask==False)[0]
-                if len(position_false) == 1: 
-                    samples_of_train_with_at_least_1_missing_views += 1
-                    samples_of_train_with_1_missing_views +=1 
-                elif len(position_false) == 2: 
-                    samples_of_train_with_at_least_1_missing_views += 1
-                    samples_of_train_with_2_missing_views += 1
-                else:
-                    samples_of_train_with_all_views += 1 
-                for el in position_false:
-                    if el == 0: samples_of_train_with_missing_views_methyl += 1
-                    if el == 1: samples_of_train_with_missing_views_mirna += 1
-                    if el == 2: samples_of_train_with_missing_views_rna += 1
-            
-            for list_mask in valid_masks:
-                position_false = np.where(list_mask==False)[0]
-                if len(position_false) == 1: 
-                    samples_of_valid_with_at_least_1_missing_views += 1
-                    samples_of_valid_with_1_missing_views +=1 
-                elif len(position_false) == 2: 
-                    samples_of_valid_with_at_least_1_missing_views += 1
-                    samples_of_valid_with_2_missing_views += 1
-                else:
-                    samples_of_valid_with_all_views += 1 
-                for el in position_false:
-                    if el == 0: samples_of_valid_with_missing_views_methyl += 1
-                    if el == 1: samples_of_valid_with_missing_views_mirna += 1
-                    if el == 2: samples_of_valid_with_missing_views_rna += 1
-                    
-            for list_mask in test_masks:
-                position_false = np.where(list_mask==False)[0]
-                if len(position_false) == 1: 
-                    samples_of_test_with_at_least_1_missing_views += 1
-                    samples_of_test_with_1_missing_views +=1 
-                elif len(position_false) == 2: 
-                    samples_of_test_with_at_least_1_missing_views += 1
-                    samples_of_test_with_2_missing_views += 1
-                else:
-                    samples_of_test_with_all_views += 1 
-                for el in position_false:
-                    if el == 0: samples_of_test_with_missing_views_methyl += 1
-                    if el == 1: samples_of_test_with_missing_views_mirna += 1
-                    if el == 2: samples_of_test_with_missing_views_rna += 1
-
-            real_output_file = f'{home_path}/{output_file}'
-            with open(f'{real_output_file}_{dataset_views_to_consider}_{seed}.md', 'w') as fd:
-                fd.write('| | Train | Valid| Test| \n')
-                fd.write('| ------------- | ------------- | ------------- | -------------:|\n')
-                fd.write(f'|Samples with at least ONE missing views|{samples_of_train_with_at_least_1_missing_views}|{samples_of_valid_with_at_least_1_missing_views}|{samples_of_test_with_at_least_1_missing_views}\n')
-                fd.write(f'|Samples with ONE missing views|{samples_of_train_with_1_missing_views}|{samples_of_valid_with_1_missing_views}|{samples_of_test_with_1_missing_views}\n')
-                fd.write(f'|Samples with TWO missing views|{samples_of_train_with_2_missing_views}|{samples_of_valid_with_2_missing_views}|{samples_of_test_with_2_missing_views}\n')
-                fd.write(f'|Samples without missing views|{samples_of_train_with_all_views}|{samples_of_valid_with_all_views}|{samples_of_test_with_all_views}\n')
-                fd.write(f'|Samples with missing MEthyl|{samples_of_train_with_missing_views_methyl}|{samples_of_valid_with_missing_views_methyl}|{samples_of_test_with_missing_views_methyl}\n')
-                fd.write(f'|Samples with missing MIRna|{samples_of_train_with_missing_views_mirna}|{samples_of_valid_with_missing_views_mirna}|{samples_of_test_with_missing_views_mirna}\n')
-                fd.write(f'|Samples with missing RNA|{samples_of_train_with_missing_views_rna}|{samples_of_valid_with_missing_views_rna}|{samples_of_test_with_missing_views_rna}\n')
-                
-        else:
-            for list_mask in train_masks:
-                position_false = np.where(list_mask==False)[0]
-                if len(position_false) == 1: 
-                    samples_of_train_with_at_least_1_missing_views += 1
-                    samples_of_train_with_1_missing_views +=1 
-                elif len(position_false) == 2: 
-                    samples_of_train_with_at_least_1_missing_views += 1
-                    samples_of_train_with_2_missing_views += 1
-                elif len(position_false) == 3: 
-                    samples_of_train_with_at_least_1_missing_views += 1
-                    samples_of_train_with_3_missing_views += 1
-                elif len(position_false) == 4: 
-                    samples_of_train_with_at_least_1_missing_views += 1
-                    samples_of_train_with_4_missing_views += 1    
-                else:
-                    samples_of_train_with_all_views += 1
-                for el in position_false:
-                    if el == 0: samples_of_train_with_missing_views_cnv += 1
-                    if el == 1: samples_of_train_with_missing_views_methyl += 1
-                    if el == 2: samples_of_train_with_missing_views_mirna += 1
-                    if el == 3: samples_of_train_with_missing_views_rna += 1
-                    if el == 4: samples_of_train_with_missing_views_protein += 1
-                    
-            for list_mask in valid_masks:
-                position_false = np.where(list_mask==False)[0]
-                if len(position_false) == 1: 
-                    samples_of_valid_with_at_least_1_missing_views += 1
-                    samples_of_valid_with_1_missing_views +=1 
-                elif len(position_false) == 2: 
-                    samples_of_valid_with_at_least_1_missing_views += 1
-                    samples_of_valid_with_2_missing_views += 1
-                elif len(position_false) == 3: 
-                    samples_of_valid_with_at_least_1_missing_views += 1
-                    samples_of_valid_with_3_missing_views += 1
-                elif len(position_false) == 4: 
-                    samples_of_valid_with_at_least_1_missing_views += 1
-                    samples_of_valid_with_4_missing_views += 1    
-                else:
-                    samples_of_valid_with_all_views += 1
-                for el in position_false:
-                    if el == 0: samples_of_valid_with_missing_views_cnv += 1
-                    if el == 1: samples_of_valid_with_missing_views_methyl += 1
-                    if el == 2: samples_of_valid_with_missing_views_mirna += 1
-                    if el == 3: samples_of_valid_with_missing_views_rna += 1
-                    if el == 4: samples_of_valid_with_missing_views_protein += 1
-            
-            for list_mask in test_masks:
-                position_false = np.where(list_mask==False)[0]
-                if len(position_false) == 1: 
-                    samples_of_test_with_at_least_1_missing_views += 1
-                    samples_of_test_with_1_missing_views +=1 
-                elif len(position_false) == 2: 
-                    samples_of_test_with_at_least_1_missing_views += 1
-                    samples_of_test_with_2_missing_views += 1
-                elif len(position_false) == 3: 
-                    samples_of_test_with_at_least_1_missing_views += 1
-                    samples_of_test_with_3_missing_views += 1
-                elif len(position_false) == 4: 
-                    samples_of_test_with_at_least_1_missing_views += 1
-                    samples_of_test_with_4_missing_views += 1    
-                else:
-                    samples_of_test_with_all_views += 1
-                for el in position_false:
-                    if el == 0: samples_of_test_with_missing_views_cnv += 1
-                    if el == 1: samples_of_test_with_missing_views_methyl += 1
-                    if el == 2: samples_of_test_with_missing_views_mirna += 1
-                    if el == 3: samples_of_test_with_missing_views_rna += 1
-                    if el == 4: samples_of_test_with_missing_views_protein += 1
-        
-            real_output_file = f'{home_path}/{output_file}'
-            with open(f'{real_output_file}_{dataset_views_to_consider}_{seed}.md', 'w') as fd:
-                fd.write('| | Train | Valid| Test| \n')
-                fd.write('| ------------- | ------------- | ------------- | -------------:|\n')
-                fd.write(f'|Samples with at least ONE missing views|{samples_of_train_with_at_least_1_missing_views}|{samples_of_valid_with_at_least_1_missing_views}|{samples_of_test_with_at_least_1_missing_views}\n')
-                fd.write(f'|Samples with ONE missing views|{samples_of_train_with_1_missing_views}|{samples_of_valid_with_1_missing_views}|{samples_of_test_with_1_missing_views}\n')
-                fd.write(f'|Samples with TWO missing views|{samples_of_train_with_2_missing_views}|{samples_of_valid_with_2_missing_views}|{samples_of_test_with_2_missing_views}\n')
-                fd.write(f'|Samples with THREE missing views|{samples_of_train_with_3_missing_views}|{samples_of_valid_with_3_missing_views}|{samples_of_test_with_3_missing_views}\n')
-                fd.write(f'|Samples with FOUR missing views|{samples_of_train_with_4_missing_views}|{samples_of_valid_with_4_missing_views}|{samples_of_test_with_4_missing_views}\n')
-                fd.write(f'|Samples without missing views|{samples_of_train_with_all_views}|{samples_of_valid_with_all_views}|{samples_of_test_with_all_views}\n')
-                fd.write(f'|Samples with missing MEthyl|{samples_of_train_with_missing_views_methyl}|{samples_of_valid_with_missing_views_methyl}|{samples_of_test_with_missing_views_methyl}\n')
-                fd.write(f'|Samples with missing MIRna|{samples_of_train_with_missing_views_mirna}|{samples_of_valid_with_missing_views_mirna}|{samples_of_test_with_missing_views_mirna}\n')
-                fd.write(f'|Samples with missing RNA|{samples_of_train_with_missing_views_rna}|{samples_of_valid_with_missing_views_rna}|{samples_of_test_with_missing_views_rna}\n')
-                fd.write(f'|Samples with missing CNV|{samples_of_train_with_missing_views_cnv}|{samples_of_valid_with_missing_views_cnv}|{samples_of_test_with_missing_views_cnv}\n')
-                fd.write(f'|Samples with missing Protein|{samples_of_train_with_missing_views_protein}|{samples_of_valid_with_missing_views_protein}|{samples_of_test_with_missing_views_protein}\n')
+        # the counts are read from the patients x views index of the dataset, no sample is loaded
+        index = dataset.patient_view_index
+        splits_indices = [train.indices, valid.indices, test.indices]
+        nb_views = len(dataset.views)
+        rows = [('Samples with at least ONE missing views', {'max_views': nb_views - 1}),
+                ('Samples with ONE missing views', {'nb_views': nb_views - 1}),
+                ('Samples with TWO missing views', {'nb_views': nb_views - 2})]
+        if dataset_views_to_consider != '3_main_omics':
+            rows += [('Samples with THREE missing views', {'nb_views': nb_views - 3}),
+                     ('Samples with FOUR missing views', {'nb_views': nb_views - 4})]
+        rows += [('Samples without missing views', {'nb_views': nb_views}),
+                 ('Samples with missing MEthyl', {'without_views': 'methyl'}),
+                 ('Samples with missing MIRna', {'without_views': 'mirna'}),
+                 ('Samples with missing RNA', {'without_views': 'rna'})]
+        if dataset_views_to_consider != '3_main_omics':
+            rows += [('Samples with missing CNV', {'without_views': 'cnv'}),
+                     ('Samples with missing Protein', {'without_views': 'protein'})]
+        real_output_file = f'{home_path}/{output_file}'
+        with open(f'{real_output_file}_{dataset_views_to_consider}_{seed}.md', 'w') as fd:
+            fd.write('| | Train | Valid| Test| \n')
+            fd.write('| ------------- | ------------- | ------------- | -------------:|\n')
+            for row_name, query in rows:
+                fd.write(f'|{row_name}|' + '|'.join(str(index.count(indices=indices, **query)) for indices in splits_indices) + '\n')
                 
 class FiguresArticles:
     def __init__(self, data_size: int = 2000, dataset_views_to_consider: str = 'all'):
         super(FiguresArticles, self).__init__()
-        self.dataset = MultiomicDatasetNormal(data_size=data_size, views_to_consider=dataset_views_to_consider)
+        self.dataset = MultiomicDatasetNormal(data_size=data_size, views_to_consider=dataset_views_to_consider, lazy_views=True)
         self.dataset_views_to_consider = dataset_views_to_consider
         
     @staticmethod
@@ -332,28 +189,13 @@ class FiguresArticles:
         plt.close(fig)
     
     def build_supplementary_figures(self) -> None:
-        temporaire_dict = defaultdict(dict)
-        for patient_name in self.dataset.all_patient_names:
-            cpt = 0; list_of_omics_per_patients = []
-            if self.dataset_views_to_consider == 'all':
-                if patient_name in self.dataset.views[0]['patient_names']: cpt+=1; list_of_omics_per_patients.append('c')
-                if patient_name in self.dataset.views[1]['patient_names']: cpt+=1; list_of_omics_per_patients.append('me')
-                if patient_name in self.dataset.views[2]['patient_names']: cpt+=1; list_of_omics_per_patients.append('mi')
-                if patient_name in self.dataset.views[3]['patient_names']: cpt+=1; list_of_omics_per_patients.append('r')
-                if patient_name in self.dataset.views[4]['patient_names']: cpt+=1; list_of_omics_per_patients.append('p')
-                temporaire_dict[patient_name] = [cpt, list_of_omics_per_patients]
-            else:
-                if patient_name in self.dataset.views[0]['patient_names']: cpt+=1; list_of_omics_per_patients.append('me')
-                if patient_name in self.dataset.views[1]['patient_names']: cpt+=1; list_of_omics_per_patients.append('mi')
-                if patient_name in self.dataset.views[2]['patient_names']: cpt+=1; list_of_omics_per_patients.append('r')
-                temporaire_dict[patient_name] = [cpt, list_of_omics_per_patients]
-                
-        values_temporaire_dict = np.asarray(list(temporaire_dict.values()))
-        comptes = values_temporaire_dict[:,0]
-        comptes_list_of_omics_per_patients = values_temporaire_dict[:,1]
-        x_comptes, y_comptes = np.unique(comptes, return_counts=True)
-        x_comptes_list_of_omics_per_patients, y_comptes_list_of_omics_per_patients = np.unique(comptes_list_of_omics_per_patients, return_counts=True)
-        x_comptes_list_of_omics_per_patients = np.array(['_'.join(el) for el in x_comptes_list_of_omics_per_patients])
+        views_abbreviations = {'cnv': 'c', 'methyl': 'me', 'mirna': 'mi', 'rna': 'r', 'protein': 'p'}
+        index = self.dataset.patient_view_index
+        x_comptes, y_comptes = np.unique(index.nb_views, return_counts=True)
+        combinations_counts = {'_'.join(views_abbreviations[view] for view in views): count 
+                               for views, count in index.combinations_counts().items()}
+        x_comptes_list_of_omics_per_patients = np.array(sorted(combinations_counts))
+        y_comptes_list_of_omics_per_patients = np.array([combinations_counts[el] for el in x_comptes_list_of_omics_per_patients])
         self.bar_plot(x=x_comptes, 
                     y=y_comptes,
                     title='Samples number with n views', 
@@ -370,7 +212,7 @@ class FiguresArticles:
                     fig_name='plot_number_of_samples_for_each_combination_available', 
                     x_label='Omics data combination', 
                     y_label='Number of samples')   
-        cancer_names_arrays = np.asarray([self.dataset.label_encoder.inverse_transform([i])[0] for i in self.dataset.all_patient_labels])
+        cancer_names_arrays = self.dataset.label_encoder.inverse_transform(self.dataset.all_patient_labels)
         x_cancer_names_arrays, y_cancer_names_arrays = np.unique(cancer_names_arrays, return_counts=True)
         self.bar_plot(x=x_cancer_names_arrays, 
                       y=y_cancer_names_arrays, 
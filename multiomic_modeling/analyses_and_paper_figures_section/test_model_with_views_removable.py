@@ -28,10 +28,19 @@ class TurnOffViewsDatasetNormal(MultiomicDatasetNormal):
         self.view_to_turn_off =  view_to_turn_off
         self._dict_of_the_combinations = {'cnv': 0, 'methyl': 1, 'mirna': 2, 'rna': 3, 'protein': 4}
         
+    def __getitems__(self, indices):
+        indices = np.asarray(indices)
+        data, original_mask = self.fetch_batch(indices)
+        mask = original_mask.copy()
+        if self.view_to_turn_off != ['none']:
+            mask[:, [self._dict_of_the_combinations[el] for el in self.view_to_turn_off]] = False
+        return self.collated_batch((data, mask, original_mask), indices)
+
     def __getitem__(self, idx): 
+        if isinstance(idx, (list, np.ndarray)): return self.__getitems__(idx)
         patient_name = self.all_patient_names[idx]
         patient_label = self.all_patient_labels[idx]
-        data = np.zeros((len(self.views), self.nb_features)) # nombre_views X nombre_features
+        data = np.zeros((len(self.views), self.nb_features), dtype=self.dtype) # nombre_views X nombre_features
         for i, view in enumerate(self.views):
             if patient_name in view['patient_names']:
                 try:
@@ -40,7 +49,7 @@ class TurnOffViewsDatasetNormal(MultiomicDatasetNormal):
                     data[i][:view['data'][view['patient_names'].get(patient_name, 0)].shape[0]] = view['data'][view['patient_names'].get(patient_name, 0)]
         mask = np.array([(patient_name in view['patient_names']) for view in self.views])
         original_mask = deepcopy(mask)
-        original_data = data.astype(float)
+        original_data = data
         if self.view_to_turn_off == ['none']: pass
         else: 
             for el in self.view_to_turn_off: mask[self._dict_of_the_combinations[el]] = False
@@ -63,18 +72,8 @@ class TestModels:
     
     def build_set_of_potential_patients_targets(self, nb_views_per_patients: int = 5) -> list:
         assert nb_views_per_patients in [1,2,3,4,5], f'We should have 1,2,3,4 or 5 combined view per patients. This {nb_views_per_patients} is not correct'
-        temporaire_dict = defaultdict(dict)
-        for patient_name in self.dataset.all_patient_names:
-            cpt = 0; list_of_omics_per_patients = []
-            if patient_name in self.dataset.views[0]['patient_names']: cpt+=1; list_of_omics_per_patients.append('c')
-            if patient_name in self.dataset.views[1]['patient_names']: cpt+=1; list_of_omics_per_patients.append('me')
-            if patient_name in self.dataset.views[2]['patient_names']: cpt+=1; list_of_omics_per_patients.append('mi')
-            if patient_name in self.dataset.views[3]['patient_names']: cpt+=1; list_of_omics_per_patients.append('r')
-            if patient_name in self.dataset.views[4]['patient_names']: cpt+=1; list_of_omics_per_patients.append('p')
-            temporaire_dict[patient_name] = [cpt, list_of_omics_per_patients]
-        values_temporaire_dict = np.asarray(list(temporaire_dict.values()))
-        list_patients_with_nb_views = [patient_name for patient_name, value in temporaire_dict.items() if value[0] == nb_views_per_patients]
-        return list_patients_with_nb_views
+        index = self.dataset.patient_view_index
+        return list(index.patient_names[index.query(nb_views=nb_views_per_patients)])
     
     def initialisation(self, 
                        config_file: str = '', 
@@ -84,15 +83,8 @@ class TestModels:
         self.dataset = MultiomicDatasetNormal(data_size=data_size, views_to_consider=dataset_views_to_consider)
         _, new_test, _ = MultiomicDatasetBuilder.multiomic_data_normal_builder(dataset=self.dataset, test_size=0.2, valid_size=0.1, random_state=random_state)
         self.list_patients_with_nb_views = self.build_set_of_potential_patients_targets(nb_views_per_patients=self.number_of_view_to_consider)
-        position_test_set_indices_to_retain = []
-        patients_name_to_retain = []
-        for idx in range(len(new_test.indices)):
-            original_mask_patient_in_test_set = new_test[idx][0][-1]
-            original_patient_name = new_test[idx][2]
-            if sum(original_mask_patient_in_test_set) == self.number_of_view_to_consider and original_patient_name in self.list_patients_with_nb_views: 
-                if original_patient_name not in patients_name_to_retain:
-                    position_test_set_indices_to_retain.append(idx)
-                    patients_name_to_retain.append(original_patient_name)
+        # positions in the test set of the patients with number_of_view_to_consider views, read from the index (no sample is loaded)
+        position_test_set_indices_to_retain = self.dataset.patient_view_index.positions(new_test.indices, nb_views=self.number_of_view_to_consider)
         old_indices = deepcopy(new_test.indices)
         self.new_test_indices = list(np.asarray(old_indices)[position_test_set_indices_to_retain])
         assert config_file != '', 'must have a config file (from the best model ultimately)'
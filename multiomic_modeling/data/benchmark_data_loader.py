@@ -0,0 +1,80 @@
+import argparse
+import resource
+import time
+import numpy as np
+from torch.utils.data import DataLoader, SubsetRandomSampler
+from multiomic_modeling.data.data_loader import MultiomicDatasetNormal, AlignedViewsStore
+from multiomic_modeling.models.utils import c_collate
+
+def samples_per_second(dataset, nb_samples: int = 2000, random_state: int = 42) -> float:
+    """ Time random __getitem__ calls on the dataset and return the number of samples served per second """
+    idxs = np.random.RandomState(random_state).randint(0, len(dataset), size=nb_samples)
+    start = time.perf_counter()
+    for idx in idxs:
+        dataset[idx]
+    return nb_samples / (time.perf_counter() - start)
+
+def benchmark_dense_store(data_size: int = 2000, views_to_consider: str = 'all', nb_samples: int = 2000) -> dict:
+    dataset = MultiomicDatasetNormal(data_size=data_size, views_to_consider=views_to_consider)
+    legacy = samples_per_second(dataset, nb_samples=nb_samples)
+    start = time.perf_counter()
+    dataset.dense_store = AlignedViewsStore(views=dataset.views, patient_names=dataset.all_patient_names, nb_features=dataset.nb_features)
+    build_time = time.perf_counter() - start
+    dense = samples_per_second(dataset, nb_samples=nb_samples)
+    results = {'legacy_samples_per_sec': legacy, 'dense_samples_per_sec': dense,
+               'speedup': dense / legacy, 'dense_store_build_time_sec': build_time,
+               'dense_store_nbytes': dataset.dense_store.data.nbytes}
+    print(f'data_size={data_size} views={views_to_consider}: legacy {legacy:.0f} samples/s, dense {dense:.0f} samples/s '
+          f'(x{dense / legacy:.1f}, store built in {build_time:.2f}s, {dataset.dense_store.data.nbytes / 2**20:.0f} MiB)')
+    return results
+
+def benchmark_startup(data_size: int = 2000, views_to_consider: str = 'all', mmap: bool = False, cache: bool = False, 
+                      container: bool = False) -> dict:
+    """ Build the dataset and report the startup time and the peak RSS of the process (run it in a fresh process) """
+    start = time.perf_counter()
+    dataset = MultiomicDatasetNormal(data_size=data_size, views_to_consider=views_to_consider, mmap=mmap, cache=cache, container=container)
+    startup_time = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(f'data_size={data_size} views={views_to_consider} mmap={mmap} cache={cache} container={container}: {len(dataset)} patients loaded in {startup_time:.2f}s, '
+          f'peak RSS {peak_rss / 2**20:.0f} MiB')
+    dataset.print_startup_report()
+    return {'startup_time_sec': startup_time, 'peak_rss_bytes': peak_rss, 'startup_report': dataset.startup_report}
+
+def benchmark_collate_bandwidth(data_size: int = 2000, views_to_consider: str = 'all', batch_size: int = 32, nb_batches: int = 50) -> dict:
+    """ Time the per sample DataLoader + c_collate path for float64 and float32 samples and report the bytes moved per batch """
+    results = {}
+    for dtype in [np.float64, np.float32]:
+        dataset = MultiomicDatasetNormal(data_size=data_size, views_to_consider=views_to_consider, dtype=dtype)
+        sampler = SubsetRandomSampler(np.random.RandomState(42).permutation(len(dataset))[:batch_size * nb_batches])
+        loader = DataLoader(dataset, batch_size=batch_size, sampler=sampler, collate_fn=c_collate)
+        start = time.perf_counter()
+        nbytes = [batch[0][0].element_size() * batch[0][0].nelement() for batch in loader]
+        elapsed = time.perf_counter() - start
+        name = np.dtype(dtype).name
+        results[name] = {'batch_nbytes': np.mean(nbytes), 'batches_per_sec': len(nbytes) / elapsed, 'mib_per_sec': np.sum(nbytes) / elapsed / 2**20}
+        print(f'data_size={data_size} views={views_to_consider} dtype={name}: {np.mean(nbytes) / 2**20:.2f} MiB per batch of {batch_size}, '
+              f'{len(nbytes) / elapsed:.1f} batches/s ({np.sum(nbytes) / elapsed / 2**20:.0f} MiB/s)')
+    print(f"float32 batches are x{results['float64']['batch_nbytes'] / results['float32']['batch_nbytes']:.1f} smaller and "
+          f"collated x{results['float32']['batches_per_sec'] / results['float64']['batches_per_sec']:.2f} faster")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the multiomic datasets sample fetching.")
+    parser.add_argument('-s', '--data_size', type=int, default=2000)
+    parser.add_argument('-d_view', '--dataset_views_to_consider', type=str, default='all')
+    parser.add_argument('-n', '--nb_samples', type=int, default=2000)
+    parser.add_argument('--startup', action='store_true', help='only measure the dataset startup time and peak RSS')
+    parser.add_argument('--mmap', action='store_true', help='memory map the views instead of loading them in RAM')
+    parser.add_argument('--cache', action='store_true', help='reuse (or write) the dataset state saved in the DatasetStateCache')
+    parser.add_argument('--container', action='store_true', help='read the views from the multiomic container of the data size')
+    parser.add_argument('--collate', action='store_true', help='compare the collate bandwidth of float64 and float32 samples')
+    parser.add_argument('-bs', '--batch_size', type=int, default=32)
+    args = parser.parse_args()
+    if args.startup:
+        benchmark_startup(data_size=args.data_size, views_to_consider=args.dataset_views_to_consider, mmap=args.mmap, cache=args.cache, 
+                          container=args.container)
+    elif args.collate:
+        benchmark_collate_bandwidth(data_size=args.data_size, views_to_consider=args.dataset_views_to_consider, batch_size=args.batch_size, 
+                                    nb_batches=args.nb_samples // args.batch_size)
+    else:
+        benchmark_dense_store(data_size=args.data_size, views_to_consider=args.dataset_views_to_consider, nb_samples=args.nb_samples)
@@ -3,37 +3,59 @@ import pandas as pd
 import os
 import pickle
 import h5py
+import json
+import time
+import hashlib
+import argparse
+import resource
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from collections import defaultdict
 from scipy.stats import median_abs_deviation
 from sklearn.feature_selection import SelectKBest, mutual_info_classif
+from multiomic_modeling.data.feature_scoring import FeatureScoringEngine, patients_labels
+from multiomic_modeling.data.codecs import ViewCodec
+try:
+    import hdf5plugin # lz4 and blosc filters of the chunked views
+except ImportError:
+    hdf5plugin = None
+try:
+    import pyarrow
+    from pyarrow import csv as pyarrow_csv, feather, ipc
+except ImportError:
+    pyarrow = None # the view files are then parsed with pandas
 local_file_path_origin='/Volumes/Second Part/TCGA Pan-Cancer (PANCAN)/'
 # graham_file_path_origin='/home/maoss2/project/maoss2/tcga_pan_cancer_dataset'
 graham_file_path_origin='/project/6000474/maoss2/tcga_pan_cancer_dataset'
+survival_file_path = f'{graham_file_path_origin}/data_hdf5/Survival_SupplementalTable_S1_20171025_xena_sp'
 LOCAL = False
-def read_chunk_file(fichier_path, saving_file_name, chunk_size=100000):
+# directory of the Feather conversions of the view files (next to the files if not set, e.g. when the raw data is read only)
+feather_cache_dir = os.environ.get('FEATHER_CACHE_DIR')
+def read_chunk_file(fichier_path, saving_file_name, chunk_size=100000, compression=None):
     """
-    Read the CSV file with th chunk_size to fit in memory.
-    Build a hdf5? pickle? file from it?*** to be determined
+    Read the CSV file with th chunk_size to fit in memory and append each chunk of features to the single resizable
+    (patients X features) dataset of the hdf5 file (see create_view_dataset).
     """
-    hf = h5py.File(f'{saving_file_name}', 'w')
     fichier_read_chunk = pd.read_csv(fichier_path, sep='\t', chunksize=chunk_size)
     features_names = []
     patients_names = []
-    for idx, chunk in enumerate(fichier_read_chunk):
-        try:
-            chunk.index = chunk['Sample']
-            chunk.drop('Sample', axis=1, inplace=True)
-        except KeyError:
-            chunk.index = chunk['sample'] 
-            chunk.drop('sample', axis=1, inplace=True)
-        patients_names = chunk.columns.values
-        features_names.extend(list(chunk.index.values))
-        hf.create_dataset(f'dataset_{idx}', data=chunk)
-    features_names = [str(x).encode('utf-8') for x in features_names]
-    patients_names = [str(x).encode('utf-8') for x in patients_names]
-    hf.create_dataset('features_names', data=features_names)
-    hf.create_dataset('patients_names', data=patients_names)
-    hf.close()
+    with h5py.File(f'{saving_file_name}', 'w') as hf:
+        for chunk in fichier_read_chunk:
+            try:
+                chunk.index = chunk['Sample']
+                chunk.drop('Sample', axis=1, inplace=True)
+            except KeyError:
+                chunk.index = chunk['sample'] 
+                chunk.drop('sample', axis=1, inplace=True)
+            if 'dataset' not in hf:
+                patients_names = chunk.columns.values
+                dataset = create_view_dataset(hf, shape=(len(patients_names), 0), dtype=np.float64, compression=compression, 
+                                              nb_columns_chunk=chunk_size)
+            dataset.resize(len(features_names) + len(chunk), axis=1)
+            dataset[:, len(features_names):] = chunk.values.T
+            features_names.extend(list(chunk.index.values))
+        hf.create_dataset('features_names', data=names_array(features_names))
+        hf.create_dataset('patients_names', data=names_array(patients_names))
 
 def select_features_based_on_mad(x, axe=0, nb_features=5000):
     """
@@ -51,9 +73,70 @@ def select_features_based_on_mad(x, axe=0, nb_features=5000):
     indices_features = np.argsort(mad_all_features)[::-1]
     return indices_features[:nb_features]
 
-def build_file_with_dimentionality_reduction(fichier_path, saving_file_name, nb_features_selected=2000):
-    hf = h5py.File(f'{saving_file_name}', 'w')
-    data = pd.read_csv(fichier_path, sep='\t')
+def convert_view_file_to_feather(fichier_path, feather_file=None, block_size=2**26, cache_dir=None):
+    """
+    Convert the view file once to an uncompressed Feather (Arrow IPC) file ({fichier_path}.feather, or in cache_dir /
+    feather_cache_dir if set; rebuilt if the file is newer) that the later builds and analyses memory map instead of 
+    parsing the text again. Return None if it can not be written (read only storage): the file is then parsed by pandas.
+    The text is parsed by blocks of block_size bytes with the multithreaded pyarrow csv reader and written batch by batch
+    so the memory used stays bounded. The features names column is read as strings and the patients columns as float64.
+    """
+    cache_dir = cache_dir or feather_cache_dir
+    if feather_file is None and cache_dir: feather_file = os.path.join(cache_dir, f'{os.path.basename(fichier_path)}.feather')
+    feather_file = feather_file or f'{fichier_path}.feather'
+    if os.path.exists(feather_file) and os.path.getmtime(feather_file) >= os.path.getmtime(fichier_path): return feather_file
+    try:
+        if cache_dir: os.makedirs(cache_dir, exist_ok=True)
+        write_view_file_feather(fichier_path, feather_file, block_size=block_size)
+    except OSError as e:
+        print(f'{feather_file} can not be written ({e}), {fichier_path} is parsed with pandas')
+        return None
+    return feather_file
+
+def write_view_file_feather(fichier_path, feather_file, block_size=2**26):
+    """ Parse the view file with pyarrow and write it batch by batch in feather_file (see convert_view_file_to_feather) """
+    columns = pd.read_csv(fichier_path, sep='\t', nrows=0).columns.values
+    index_column = view_index_column(fichier_path)
+    column_types = {column: pyarrow.string() if column == index_column else pyarrow.float64() for column in columns}
+    reader = pyarrow_csv.open_csv(fichier_path, read_options=pyarrow_csv.ReadOptions(block_size=block_size, use_threads=True), 
+                                  parse_options=pyarrow_csv.ParseOptions(delimiter='\t'), 
+                                  convert_options=pyarrow_csv.ConvertOptions(column_types=column_types))
+    with ipc.new_file(f'{feather_file}.tmp', reader.schema) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+    os.replace(f'{feather_file}.tmp', feather_file)
+
+def read_view_table(fichier_path):
+    """
+    The original file of a view as a DataFrame: from its memory mapped Feather conversion if pyarrow is available, parsed
+    by pandas otherwise
+    """
+    feather_file = None if pyarrow is None else convert_view_file_to_feather(fichier_path)
+    if feather_file is None: return pd.read_csv(fichier_path, sep='\t')
+    return feather.read_table(feather_file, memory_map=True).to_pandas()
+
+def iter_view_chunks(fichier_path, chunk_size=10000):
+    """
+    The original file of a view by chunks of chunk_size features (rows), indexed by the features names: slices of the
+    memory mapped Feather conversion if pyarrow is available, pandas chunked parsing otherwise
+    """
+    index_column = view_index_column(fichier_path)
+    feather_file = None if pyarrow is None else convert_view_file_to_feather(fichier_path)
+    if feather_file is None:
+        yield from pd.read_csv(fichier_path, sep='\t', index_col=index_column, chunksize=chunk_size)
+        return
+    table = feather.read_table(feather_file, memory_map=True)
+    for start in range(0, table.num_rows, chunk_size):
+        chunk = table.slice(start, chunk_size).to_pandas()
+        if index_column is None: chunk.index = pd.RangeIndex(start, start + len(chunk))
+        else: chunk = chunk.set_index(index_column)
+        yield chunk
+
+def read_view_file(fichier_path):
+    """
+    Read the original file of a view (features in rows, patients in columns) and drop the features with missing values
+    """
+    data = read_view_table(fichier_path)
     if 'Sample' in data.columns.values:
         data.index = data['Sample']
         data.drop('Sample', axis=1, inplace=True)
@@ -64,6 +147,390 @@ def build_file_with_dimentionality_reduction(fichier_path, saving_file_name, nb_
         data.index = data['SampleID']
         data.drop('SampleID', axis=1, inplace=True) 
     data.dropna(axis=0, inplace=True)
+    return data
+
+def view_index_column(fichier_path):
+    """
+    Name of the column holding the features names in the original file of a view (None if there is none)
+    """
+    columns = pd.read_csv(fichier_path, sep='\t', nrows=0).columns.values
+    for name in ['Sample', 'sample', 'SampleID']:
+        if name in columns: return name
+    return None
+
+def compute_features_mad_streaming(fichier_path, chunk_size=10000):
+    """
+    First pass of the streaming MAD selection: read the view file by chunks of chunk_size features (rows) and compute the
+    MAD of each feature without missing values (the MAD of a feature only depends on its row so it is exact)
+    Args:
+        fichier_path, str, path of the original file of the view
+        chunk_size, int, number of rows read at once (bounds the memory used)
+    Return:
+        mad, the MAD of the features kept (in the file order, same as select_features_based_on_mad after the dropna)
+        rows, their positions in the file
+        features_names, their names
+        patients_names, the patients names
+    """
+    mad, rows, features_names = [], [], []
+    start = 0
+    for chunk in iter_view_chunks(fichier_path, chunk_size=chunk_size):
+        not_nan = ~chunk.isna().any(axis=1).values
+        mad.append(median_abs_deviation(chunk.values[not_nan].astype(np.float64), axis=1))
+        rows.append(start + np.flatnonzero(not_nan))
+        features_names.append(chunk.index.values[not_nan])
+        patients_names = chunk.columns.values
+        start += len(chunk)
+    return np.concatenate(mad), np.concatenate(rows), np.concatenate(features_names), patients_names
+
+def extract_rows_streaming(fichier_path, rows, chunk_size=10000):
+    """
+    Second pass of the streaming MAD selection: read the view file by chunks again and keep only the given rows
+    Args:
+        fichier_path, str, path of the original file of the view
+        rows, numpy array, positions in the file of the rows to extract
+        chunk_size, int, number of rows read at once
+    Return:
+        the (len(rows), nb_patients) array of the rows, in the order of rows
+    """
+    order = np.argsort(rows)
+    sorted_rows = rows[order]
+    data = None
+    start = 0
+    for chunk in iter_view_chunks(fichier_path, chunk_size=chunk_size):
+        if data is None: data = np.empty((len(rows), chunk.shape[1]), dtype=np.float64)
+        lo, hi = np.searchsorted(sorted_rows, [start, start + len(chunk)])
+        data[order[lo:hi]] = chunk.values[sorted_rows[lo:hi] - start]
+        start += len(chunk)
+    return data
+
+def is_cnv_file(fichier_path):
+    """
+    Whether the file is the cnv view (the only view whose features can be ranked by a scorer instead of the MAD): the
+    configured cnv_path or a gistic CopyNumber file
+    """
+    return os.path.abspath(fichier_path) == os.path.abspath(cnv_path) or fichier_path.find('CopyNumber') != -1
+
+def build_ranked_master_file(fichier_path, saving_file_name, nb_features_stored=None):
+    """
+    Build the master file of a view: its features sorted by decreasing MAD (the cnv too, like build_files_for_data_sizes
+    without a scorer) so the view reduced to any number of features is the first columns of the file (served as a column slice by MultiomicDatasetNormal(ranked=True), see FichierPathRanked).
+    The matrix (patients X features) is stored contiguous and uncompressed so it can be memory mapped.
+    Args:
+        fichier_path, str, path of the original file of the view
+        saving_file_name, str, the hdf5 file to write
+        nb_features_stored, int, number of ranked features stored (all of them if None)
+    """
+    data = read_view_file(fichier_path)
+    patients_names = data.columns.values
+    features_names = data.index.values
+    data = data.values
+    indices_ranked = select_features_based_on_mad(x=data, axe=1, nb_features=nb_features_stored)
+    write_view_file(saving_file_name, data[indices_ranked].T, features_names[indices_ranked], patients_names, ranked=True, 
+                    nb_features_view=data.shape[0])
+
+def names_array(names):
+    """ The names as fixed length UTF-8 strings (a single block read back with np.char.decode, no object array) """
+    names = [str(x).encode('utf-8') for x in names]
+    return np.array(names, dtype=h5py.string_dtype('utf-8', length=max([len(x) for x in names] + [1])))
+
+def compression_options(compression=None):
+    """
+    create_dataset arguments of the compression of the views: None, 'gzip' (level 1, always available), 'lz4' or 
+    'blosc' (blosc lz4 with byte shuffle), both from hdf5plugin which must then also be installed to read the files
+    """
+    if compression is None: return {}
+    if compression == 'gzip': return {'compression': 'gzip', 'compression_opts': 1, 'shuffle': True}
+    if compression not in ['lz4', 'blosc']: raise ValueError(f'The compression {compression} is not available: choose between gzip, lz4 and blosc')
+    if hdf5plugin is None: raise ValueError(f'The {compression} compression needs hdf5plugin (pip install hdf5plugin), use gzip otherwise')
+    if compression == 'lz4': return dict(hdf5plugin.LZ4())
+    return dict(hdf5plugin.Blosc(cname='lz4', clevel=5, shuffle=hdf5plugin.Blosc.SHUFFLE))
+
+def create_view_dataset(hf, shape, dtype, compression=None, nb_columns_chunk=None):
+    """
+    Create the (patients X features) dataset of a view, resizable along the features, chunked for the access by patient:
+    one chunk per patient row (nb_columns_chunk features, all of them by default), so reading a minibatch of patients 
+    only reads (and decompresses) the rows of these patients.
+    """
+    return hf.create_dataset('dataset', shape=shape, dtype=dtype, maxshape=(shape[0], None), chunks=(1, nb_columns_chunk or shape[1] or 1), 
+                             **compression_options(compression))
+
+def write_view_file(saving_file_name, data, features_names, patients_names, ranked=False, compression=None, chunked=False, codec=None, 
+                    nb_features_view=None):
+    """
+    Write the hdf5 file of a view: data is the (patients X features) matrix, stored contiguous and uncompressed (memory 
+    mapped in place, see ReadFiles.memory_map_dataset) or, with chunked or a compression, in the patient major chunks
+    of create_view_dataset. With codec (uint8, uint16, int8, float16 or auto, see ViewCodec) the matrix is stored encoded
+    and the codec recorded in the attrs of the dataset. A ranked master file records the number of features of the view
+    (nb_features_view) so the data sizes above the stored features are refused unless all of them are stored.
+    """
+    with h5py.File(f'{saving_file_name}', 'w') as hf:
+        write_view_group(hf, data, features_names, patients_names, ranked=ranked, compression=compression, chunked=chunked, codec=codec, 
+                         nb_features_view=nb_features_view)
+
+def write_view_group(hf, data, features_names, patients_names, ranked=False, compression=None, chunked=False, codec=None, 
+                     nb_features_view=None):
+    """ Write the datasets of a view (dataset, features_names, patients_names) in the hdf5 file or group hf """
+    view_codec = None if codec is None else ViewCodec.fit(data, codec)
+    if view_codec is not None: data = view_codec.encode(data)
+    if chunked or compression is not None:
+        create_view_dataset(hf, shape=data.shape, dtype=data.dtype, compression=compression)[()] = data
+    else:
+        hf.create_dataset('dataset', data=np.ascontiguousarray(data))
+    hf.create_dataset('features_names', data=names_array(features_names))
+    hf.create_dataset('patients_names', data=names_array(patients_names))
+    if ranked: hf['dataset'].attrs['ranked'] = True
+    if ranked: hf['dataset'].attrs['nb_features_view'] = data.shape[1] if nb_features_view is None else nb_features_view
+    if view_codec is not None: hf['dataset'].attrs.update(view_codec.attrs())
+
+def build_multiomic_container(views_files, saving_file_name, survival_file=None, patients_without_view_file=None, 
+                              compression=None, chunked=False):
+    """
+    Gather the view files of a data size in a single container (FichierPathContainer of the data_loader) read by the
+    datasets without any realignment. The patients axis is the patients of the survival file (in its order, like 
+    MultiomicDatasetNormal.build_state) available in at least one view, without the patients of patients_without_view_file.
+    Each view is the group {view_name}, laid out like a view file with its rows in the order of the axis, and the file holds 
+    the views_names, the (patients X views) views_rows (row of the patient in the group, -1 if the view is missing) and 
+    availability matrices and the labels of the patients encoded on label_classes.
+    Args:
+        views_files, dict {view_name (cnv, methyl, mirna, rna, rna_iso, protein): path of its hdf5 file}
+        saving_file_name, str, the container to write
+        survival_file, str, survival table of the labels (survival_file_path if None)
+        patients_without_view_file, str, list of the patients to exclude (one per line, ignored if None or missing)
+        compression, chunked, layout of the views (see write_view_file)
+    """
+    survival_data = pd.read_csv(survival_file or survival_file_path, sep='\t')
+    sample_to_labels = dict(zip(survival_data['sample'].values, survival_data['cancer type abbreviation'].values))
+    names = np.asarray(list(sample_to_labels.keys()))
+    views_patients = {}
+    for view_name, fichier in views_files.items():
+        with h5py.File(fichier, 'r') as d:
+            views_patients[view_name] = np.char.decode(d['patients_names'][()].astype(bytes), 'utf-8')
+    keep = np.zeros(len(names), dtype=bool)
+    for patients in views_patients.values(): keep |= np.isin(names, patients)
+    if patients_without_view_file is not None and os.path.exists(patients_without_view_file):
+        with open(patients_without_view_file, 'r') as f:
+            keep &= ~np.isin(names, [line.strip('\n') for line in f.readlines()])
+    patients_names = names[keep]
+    label_classes, labels = np.unique(np.asarray([sample_to_labels[name] for name in patients_names], dtype=str), return_inverse=True)
+    views_rows = np.full((len(patients_names), len(views_files)), -1, dtype=np.int64)
+    with h5py.File(f'{saving_file_name}.tmp', 'w') as hf:
+        # one view in memory at a time
+        for i, (view_name, fichier) in enumerate(views_files.items()):
+            position = dict(zip(views_patients[view_name], np.arange(len(views_patients[view_name]))))
+            source_rows = np.asarray([position.get(name, -1) for name in patients_names], dtype=np.int64)
+            present = source_rows >= 0
+            views_rows[present, i] = np.arange(np.sum(present))
+            with h5py.File(fichier, 'r') as d:
+                data, features_names = d['dataset'][()][source_rows[present]], np.char.decode(d['features_names'][()].astype(bytes), 'utf-8')
+                attrs = dict(d['dataset'].attrs) # the codec of the view, its data is copied encoded
+            group = hf.create_group(view_name)
+            write_view_group(group, data, features_names, patients_names[present], compression=compression, chunked=chunked)
+            group['dataset'].attrs.update(attrs)
+            del data
+        hf.create_dataset('patients_names', data=names_array(patients_names))
+        hf.create_dataset('views_names', data=names_array(views_files.keys()))
+        hf.create_dataset('views_rows', data=views_rows)
+        hf.create_dataset('availability', data=views_rows >= 0)
+        hf.create_dataset('labels', data=labels.astype(np.int64))
+        hf.create_dataset('label_classes', data=names_array(label_classes))
+    os.replace(f'{saving_file_name}.tmp', saving_file_name)
+
+def build_files_for_data_sizes(fichier_path, saving_file_name_prefix, nb_features_list=(2000, 5000, 10000), ranked_file_name=None, 
+                               nb_features_stored=None, chunk_size=10000, scorer=None, nb_scoring_workers=1, survival_file=None, 
+                               compression=None, chunked=False, codec=None, is_cnv=None):
+    """
+    Parse the view file and rank its features once, then write from this single ranking the reduced file of every size
+    ({saving_file_name_prefix}_{size}.h5, the same files as build_file_with_dimentionality_reduction on the MAD views) and, if 
+    ranked_file_name is given, the ranked master file (see build_ranked_master_file).
+    The views, the cnv included, are ranked on the MAD of their features in two streaming passes (see 
+    compute_features_mad_streaming and extract_rows_streaming); with a scorer the cnv is loaded once and its features
+    scored by the FeatureScoringEngine.
+    Args:
+        fichier_path, str, path of the original file of the view
+        saving_file_name_prefix, str, path of the reduced files without the _{size}.h5 suffix
+        nb_features_list, list of int, the sizes of the reduced files to write
+        ranked_file_name, str, the ranked master file to write (None to skip it)
+        nb_features_stored, int, number of ranked features stored in the master file (max(nb_features_list) if None)
+        chunk_size, int, number of rows read at once for the MAD views
+        scorer, str, scorer of the cnv features (see FeatureScorers), None for the MAD like the other views. The features 
+            of each size are the best ones, best first.
+        nb_scoring_workers, int, number of processes of the FeatureScoringEngine
+        survival_file, str, survival table of the label aware scorers (survival_file_path if None)
+        compression, chunked, layout of the reduced files (see write_view_file), the ranked master file stays contiguous
+            so it is memory mapped in place
+        codec, str, storage codec of the reduced files and of the ranked master file (see ViewCodec), None to keep float64
+        is_cnv, bool, whether the file is the cnv view (is_cnv_file if None), the only view a scorer is used on
+    """
+    if is_cnv is None: is_cnv = is_cnv_file(fichier_path)
+    if scorer is not None and not is_cnv: raise ValueError(f'The scorer {scorer} is only used on the cnv view and {fichier_path} is not the cnv file')
+    nb_features_stored = nb_features_stored or max(nb_features_list)
+    nb_max = max(list(nb_features_list) + [nb_features_stored if ranked_file_name is not None else 0])
+    if scorer is not None:
+        data = read_view_file(fichier_path)
+        patients_names, features_names, data = data.columns.values, data.index.values, data.values.T
+        nb_features_view = data.shape[1]
+        scores = score_view_features(data=data, features_names=features_names, patients_names=patients_names, fichier_path=fichier_path, 
+                                     scorer=scorer, nb_workers=nb_scoring_workers, survival_file=survival_file)
+        indices_ranked = FeatureScoringEngine.rank(scores)
+        sizes_columns = {size: indices_ranked[:size] for size in nb_features_list}
+        ranked_columns = indices_ranked[:nb_features_stored]
+    else:
+        mad, rows, features_names, patients_names = compute_features_mad_streaming(fichier_path=fichier_path, chunk_size=chunk_size)
+        indices_mad_ranked = np.argsort(mad)[::-1][:nb_max]
+        # the best nb_max features in the MAD order: every size is a prefix of it
+        data = extract_rows_streaming(fichier_path=fichier_path, rows=rows[indices_mad_ranked], chunk_size=chunk_size).T
+        features_names = features_names[indices_mad_ranked]
+        sizes_columns = {size: np.arange(min(size, data.shape[1])) for size in nb_features_list}
+        ranked_columns = np.arange(min(nb_features_stored, data.shape[1]))
+        nb_features_view = len(mad)
+    for size, columns in sizes_columns.items():
+        write_view_file(f'{saving_file_name_prefix}_{size}.h5', data[:, columns], features_names[columns], patients_names, 
+                        compression=compression, chunked=chunked, codec=codec)
+    if ranked_file_name is not None:
+        write_view_file(ranked_file_name, data[:, ranked_columns], features_names[ranked_columns], patients_names, ranked=True, codec=codec, 
+                        nb_features_view=nb_features_view)
+
+def scores_file_name(fichier_path, scorer):
+    return f'{fichier_path}.{scorer}_scores.npz'
+
+def score_view_features(data, features_names, patients_names, fichier_path, scorer='anova', nb_workers=1, survival_file=None):
+    """
+    Scores of the features of a view with the FeatureScoringEngine, saved next to the view file (see scores_file_name)
+    and read back from it as long as the features are the same, so the files of new sizes are cut without rescoring.
+    Args:
+        data, (patients X features) matrix of the view
+        features_names, patients_names, names of the columns and of the rows of data
+        fichier_path, str, path of the original file of the view
+        scorer, str, name of the scorer (see FeatureScorers)
+        nb_workers, int, number of processes scoring the blocks of features
+        survival_file, str, survival table giving the cancer type of the patients (for the label aware scorers)
+    Return:
+        the score of each feature
+    """
+    scores = FeatureScoringEngine.load_scores(scores_file_name(fichier_path, scorer), features_names, scorer)
+    if scores is not None: return scores
+    engine = FeatureScoringEngine(scorer=scorer, nb_workers=nb_workers)
+    if engine.label_aware:
+        labels = patients_labels(patients_names, survival_file or survival_file_path)
+        labelled = labels != ''
+        if not np.any(labelled): raise ValueError(f'No patient of {fichier_path} is in the survival table')
+        scores = engine.score(data[labelled], labels[labelled])
+    else:
+        scores = engine.score(data)
+    FeatureScoringEngine.save_scores(scores_file_name(fichier_path, scorer), scores, features_names, scorer)
+    return scores
+
+def estimate_job_memory(fichier_path, nb_features_max, chunk_size=10000, scorer=None):
+    """
+    Rough peak memory (bytes) of build_files_for_data_sizes on a view file: the matrix of a view ranked by a scorer is 
+    loaded whole (about 4 times the size of the text once parsed and copied), the MAD ranking only holds a few chunks of 
+    rows and the selected rows
+    """
+    if scorer is not None: return 4 * os.path.getsize(fichier_path)
+    nb_patients = len(pd.read_csv(fichier_path, sep='\t', nrows=0).columns)
+    return 8 * nb_patients * (3 * chunk_size + 2 * nb_features_max)
+
+def peak_rss_bytes():
+    """
+    Peak RSS of the process: the high water mark of its memory (VmHWM, reset by exec) and not ru_maxrss, which keeps the 
+    peak of the parent through fork and exec (ru_maxrss where /proc is not available)
+    """
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'): return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def build_view_job(job):
+    """
+    Run the build of a view in a worker of the pool (a new spawned process per job, so its peak RSS is the one of the job
+    and not the one of the parent, which already loaded and scored the cnv)
+    """
+    start = time.perf_counter()
+    build_files_for_data_sizes(**job['params'])
+    return {'name': job['name'], 'seconds': time.perf_counter() - start, 'peak_rss_bytes': peak_rss_bytes()}
+
+def run_build_jobs(jobs, nb_workers=1, memory_budget=None):
+    """
+    Run the view jobs on a process pool: the biggest jobs are started first and a job is only started if the estimated 
+    memory of the running jobs plus its own fits in memory_budget (bytes), so two huge jobs (methyl) never run together
+    (a job bigger than the budget runs alone). Each job runs in its own spawned process: a worker killed during its job
+    (out of memory, crash in h5py) fails the job (BrokenProcessPool) instead of blocking the build.
+    Args:
+        jobs, list of dict {'name', 'params' (of build_files_for_data_sizes), 'memory' (estimated, bytes)}
+        nb_workers, int, maximum number of jobs run at the same time
+        memory_budget, int, memory available for the jobs (no limit if None)
+    Return:
+        the reports {'name', 'seconds', 'peak_rss_bytes'} (or {'name', 'error'}) of the jobs
+    """
+    pending, running, reports = sorted(jobs, key=lambda job: -job['memory']), {}, []
+    context = multiprocessing.get_context('spawn')
+    while pending or running:
+        for job in list(pending):
+            if len(running) >= max(1, nb_workers): break
+            memory_used = sum(running_job['memory'] for running_job, _ in running.values())
+            if running and memory_budget is not None and memory_used + job['memory'] > memory_budget: continue
+            pending.remove(job)
+            executor = ProcessPoolExecutor(max_workers=1, mp_context=context)
+            running[executor.submit(build_view_job, job)] = (job, executor)
+            print(f"[build] start {job['name']} (estimated {job['memory'] / 2**30:.1f} GiB, {len(running)} running)", flush=True)
+        finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+        for future in finished:
+            job, executor = running.pop(future)
+            try:
+                report = future.result()
+            except Exception as e: # the error of the job, or BrokenProcessPool if its worker died
+                report = {'name': job['name'], 'error': repr(e)}
+            executor.shutdown()
+            reports.append(report)
+            if 'error' in report: print(f"[build] {report['name']} failed: {report['error']}", flush=True)
+            else: print(f"[build] {report['name']} done in {report['seconds']:.0f}s, peak RSS {report['peak_rss_bytes'] / 2**30:.2f} GiB", flush=True)
+    return reports
+
+def file_sha256(fichier, block_size=2**24):
+    digest = hashlib.sha256()
+    with open(fichier, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def write_manifest(manifest_file, outputs, reports=()):
+    """
+    Write the json manifest of the output files {file: {'source', 'size', 'mtime_ns', 'sha256', 'seconds', 'peak_rss_bytes'}}.
+    The checksum of a file unchanged (same size and mtime) since the previous manifest is not recomputed. The outputs of a
+    failed job are recorded with its 'error' (and no checksum if the file was not written).
+    Args:
+        outputs, dict {output file: (source file, name of the job writing it)}
+        reports, the reports of run_build_jobs, their timing is recorded on the outputs of the job
+    """
+    previous = {}
+    if os.path.exists(manifest_file):
+        with open(manifest_file, 'r') as f:
+            previous = json.load(f)
+    reports = {report['name']: report for report in reports}
+    manifest = {}
+    for output, (source, job_name) in sorted(outputs.items()):
+        if job_name in reports and 'error' in reports[job_name]:
+            manifest[output] = {**previous.get(output, {}), 'source': source, 'error': reports[job_name]['error']}
+            continue
+        if not os.path.exists(output): continue
+        stat = os.stat(output)
+        entry = previous.get(output, {})
+        if entry.get('size') != stat.st_size or entry.get('mtime_ns') != stat.st_mtime_ns:
+            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': file_sha256(output)}
+        entry['source'] = source
+        entry.pop('error', None)
+        if job_name in reports: entry.update(seconds=reports[job_name]['seconds'], peak_rss_bytes=reports[job_name]['peak_rss_bytes'])
+        manifest[output] = entry
+    with open(f'{manifest_file}.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(f'{manifest_file}.tmp', manifest_file)
+    return manifest
+
+def build_file_with_dimentionality_reduction(fichier_path, saving_file_name, nb_features_selected=2000, compression=None, chunked=False):
+    data = read_view_file(fichier_path)
     patients_names = data.columns.values
     features_names = data.index.values
     data = data.values
@@ -75,23 +542,13 @@ def build_file_with_dimentionality_reduction(fichier_path, saving_file_name, nb_
         data = learner.transform(data)
         features_names = features_names[indices_selected]
         del y, learner, indices_selected
-        features_names = [str(x).encode('utf-8') for x in features_names]
-        patients_names = [str(x).encode('utf-8') for x in patients_names]
-        hf.create_dataset(f'dataset', data=data)
-        hf.create_dataset('features_names', data=features_names)
-        hf.create_dataset('patients_names', data=patients_names)
-        hf.close()
+        write_view_file(saving_file_name, data, features_names, patients_names, compression=compression, chunked=chunked)
     else:
         indices_mad_selected = select_features_based_on_mad(x=data, axe=1, nb_features=nb_features_selected)
         data = data[indices_mad_selected]
         features_names = features_names[indices_mad_selected]
         del indices_mad_selected
-        features_names = [str(x).encode('utf-8') for x in features_names]
-        patients_names = [str(x).encode('utf-8') for x in patients_names]
-        hf.create_dataset(f'dataset', data=data.T)
-        hf.create_dataset('features_names', data=features_names)
-        hf.create_dataset('patients_names', data=patients_names)
-        hf.close()
+        write_view_file(saving_file_name, data.T, features_names, patients_names, compression=compression, chunked=chunked)
         
 if LOCAL:
     exon_path = f'{local_file_path_origin}/HiSeqV2_exon'
@@ -115,29 +572,78 @@ else:
 
 
 if __name__ == '__main__':   
+    parser = argparse.ArgumentParser(description="Build the hdf5 files of the views.")
+    parser.add_argument('-w', '--nb_workers', type=int, default=int(os.environ.get('SLURM_NTASKS_PER_NODE', os.cpu_count())))
+    parser.add_argument('-m', '--memory_budget', type=float, default=None, 
+                        help='memory (GiB) shared by the jobs running together (SLURM_MEM_PER_NODE or 80%% of the RAM by default)')
+    parser.add_argument('-s', '--cnv_scorer', type=str, default=None, choices=['mad', 'variance', 'mutual_info', 'anova'],
+                        help='score the cnv features with the FeatureScoringEngine (streaming MAD selection like the other views by default)')
+    parser.add_argument('-c', '--compression', type=str, default=None, choices=['gzip', 'lz4', 'blosc'],
+                        help='compress the reduced files (chunked by patient, see create_view_dataset): smaller files (half with lz4) '
+                             'but slower to read than the contiguous default')
+    parser.add_argument('--chunked', action='store_true', help='chunk the reduced files by patient even without compression (not memory mapped)')
+    parser.add_argument('--container', action='store_true', help='also gather the reduced files of each size in a multiomic container')
+    parser.add_argument('-q', '--codecs', type=str, default=None, 
+                        help='storage codecs of the views (see ViewCodec): auto for all of them or view=codec pairs, e.g. methyl_450=uint8,cnv=int8')
+    args = parser.parse_args()
+    if args.memory_budget is not None: memory_budget = args.memory_budget * 2**30
+    elif 'SLURM_MEM_PER_NODE' in os.environ: memory_budget = int(os.environ['SLURM_MEM_PER_NODE']) * 2**20
+    else: memory_budget = 0.8 * os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
     fichiers_path = [cnv_path, methyl_450_path, rna_path, rna_isoforms_path, mirna_path, protein_path]
     saving_files_names_reduced = ['cnv_pancan_tcga_reduced', 'methyl_450_pancan_tcga_reduced', 
                                   'rna_pancan_tcga_reduced', 'rna_isoforms_pancan_tcga_reduced', 
                                   'mirna_pancan_tcga_reduced', 'protein_pancan_tcga_reduced']
+    saving_files_names_ranked = [name.replace('_reduced', '_ranked') for name in saving_files_names_reduced]
    
+    if args.codecs == 'auto': codecs = {name: 'auto' for name in saving_files_names_reduced}
+    elif args.codecs: codecs = {f'{view}_pancan_tcga_reduced': codec for view, codec in [pair.split('=') for pair in args.codecs.split(',')]}
+    else: codecs = {}
+    jobs, outputs = [], {}
     for idx, fichier in enumerate(fichiers_path):
         # read_chunk_file(fichier_path=fichier, saving_file_name=f'{graham_file_path_origin}/data_hdf5/{saving_files_names_reduced[idx]}', chunk_size=100000)
-        if os.path.exists(f'{graham_file_path_origin}/data_hdf5/{saving_files_names_reduced[idx]}_2000.h5'):
-            pass
-        else: 
-            build_file_with_dimentionality_reduction(fichier_path=fichier, 
-                                                    saving_file_name=f'{graham_file_path_origin}/data_hdf5/{saving_files_names_reduced[idx]}_2000.h5',
-                                                    nb_features_selected=2000)
-        if os.path.exists(f'{graham_file_path_origin}/data_hdf5/{saving_files_names_reduced[idx]}_5000.h5'):
-            pass    
-        else:
-            build_file_with_dimentionality_reduction(fichier_path=fichier, 
-                                                    saving_file_name=f'{graham_file_path_origin}/data_hdf5/{saving_files_names_reduced[idx]}_5000.h5',
-                                                    nb_features_selected=5000)
-        if os.path.exists(f'{graham_file_path_origin}/data_hdf5/{saving_files_names_reduced[idx]}_10000.h5'):
-            pass    
-        else:
-            build_file_with_dimentionality_reduction(fichier_path=fichier, 
-                                                    saving_file_name=f'{graham_file_path_origin}/data_hdf5/{saving_files_names_reduced[idx]}_10000.h5',
-                                                    nb_features_selected=10000)
-
+        saving_file_name_prefix = f'{graham_file_path_origin}/data_hdf5/{saving_files_names_reduced[idx]}'
+        ranked_file_name = f'{graham_file_path_origin}/data_hdf5/{saving_files_names_ranked[idx]}.h5'
+        for output in [f'{saving_file_name_prefix}_{size}.h5' for size in [2000, 5000, 10000]] + [ranked_file_name]: 
+            outputs[output] = (fichier, saving_files_names_reduced[idx])
+        # a single parse and ranking of the file for all the missing sizes (and the ranked master file)
+        nb_features_list = [size for size in [2000, 5000, 10000] if not os.path.exists(f'{saving_file_name_prefix}_{size}.h5')]
+        if os.path.exists(ranked_file_name): ranked_file_name = None
+        if nb_features_list or ranked_file_name is not None:
+            jobs.append({'name': saving_files_names_reduced[idx], 
+                         'memory': estimate_job_memory(fichier_path=fichier, nb_features_max=10000, 
+                                                       scorer=args.cnv_scorer if fichier == cnv_path else None),
+                         'params': {'fichier_path': fichier, 
+                                    'saving_file_name_prefix': saving_file_name_prefix,
+                                    'nb_features_list': nb_features_list, 
+                                    'ranked_file_name': ranked_file_name, 
+                                    'nb_features_stored': 10000, 
+                                    'scorer': args.cnv_scorer if fichier == cnv_path else None,
+                                    'is_cnv': fichier == cnv_path,
+                                    'compression': args.compression,
+                                    'chunked': args.chunked,
+                                    'codec': codecs.get(saving_files_names_reduced[idx])}})
+    if args.cnv_scorer is not None and not any(job['params']['is_cnv'] for job in jobs):
+        raise ValueError(f'The cnv scorer {args.cnv_scorer} is set but the cnv files are already built: remove them to build them again')
+    if args.cnv_scorer is not None:
+        # the cnv features are scored here on all the workers, its job in the pool then reads the saved scores
+        data = read_view_file(cnv_path)
+        score_view_features(data=data.values.T, features_names=data.index.values, patients_names=data.columns.values, fichier_path=cnv_path, 
+                            scorer=args.cnv_scorer, nb_workers=args.nb_workers)
+        del data
+    reports = run_build_jobs(jobs, nb_workers=min(args.nb_workers, max(1, len(jobs))), memory_budget=memory_budget)
+    if args.container:
+        views_names = ['cnv', 'methyl', 'rna', 'rna_iso', 'mirna', 'protein'] # same order as saving_files_names_reduced
+        for size in [2000, 5000, 10000]:
+            container_file = f'{graham_file_path_origin}/data_hdf5/multiomic_pancan_tcga_{size}.h5'
+            views_files = {view_name: f'{graham_file_path_origin}/data_hdf5/{saving_files_names_reduced[idx]}_{size}.h5' 
+                           for idx, view_name in enumerate(views_names)}
+            views_files = {view_name: fichier for view_name, fichier in views_files.items() if os.path.exists(fichier)}
+            outputs[container_file] = (', '.join(views_files.values()), f'multiomic_pancan_tcga_{size}')
+            # rebuilt when one of its views is newer
+            if os.path.exists(container_file) and all(os.path.getmtime(fichier) <= os.path.getmtime(container_file) for fichier in views_files.values()):
+                continue
+            start = time.perf_counter()
+            build_multiomic_container(views_files, container_file, patients_without_view_file=f'{graham_file_path_origin}/data_hdf5/patients_a_exclure_car_sans_vues.txt', 
+                                      compression=args.compression, chunked=args.chunked)
+            print(f'multiomic container of size {size} built in {time.perf_counter() - start:.0f}s')
+    write_manifest(f'{graham_file_path_origin}/data_hdf5/manifest.json', outputs, reports)
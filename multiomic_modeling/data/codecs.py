@@ -0,0 +1,143 @@
+import numpy as np
+from scipy import sparse
+
+
+class ViewCodec:
+    """ Storage codec of a view matrix, recorded in the attrs of its hdf5 dataset (codec, scale, offset, nan_code):
+            uint8, uint16, linear quantization of the values (methylation beta values in [0, 1]): value = code * scale + offset
+            int8, the small integers of the thresholded cnv, stored as they are
+            float16, half precision (expression)
+        The missing values (nan) get their own code (nan_code) in the integer codecs.
+    """
+    codecs = ['uint8', 'uint16', 'int8', 'float16']
+
+    def __init__(self, codec: str, scale: float = 1.0, offset: float = 0.0, nan_code: int = None):
+        if codec not in self.codecs: raise ValueError(f'The codec {codec} is not available: choose between {self.codecs}')
+        self.codec, self.scale, self.offset, self.nan_code = codec, float(scale), float(offset), nan_code
+
+    @classmethod
+    def fit(cls, data: np.ndarray, codec: str = 'auto') -> 'ViewCodec':
+        """ Codec of the data: the given one with its scale and offset, or with auto int8 for integer values, uint16 for the
+            values in [0, 1] and float16 otherwise (None if the values do not fit in a float16)
+        """
+        finite = data[np.isfinite(data)]
+        has_nan = finite.size < data.size
+        low, high = (float(finite.min()), float(finite.max())) if finite.size else (0.0, 0.0)
+        integral = bool(np.all(finite == np.round(finite)))
+        if codec == 'auto':
+            if integral and low >= -127 and high <= 127: codec = 'int8'
+            elif low >= 0 and high <= 1: codec = 'uint16'
+            elif max(abs(low), abs(high)) < float(np.finfo(np.float16).max): codec = 'float16'
+            else: return None
+        if codec == 'int8':
+            if not integral or low < -127 or high > 127: raise ValueError('The int8 codec needs integer values in [-127, 127]')
+            return cls(codec, nan_code=-128 if has_nan else None)
+        if codec == 'float16':
+            if max(abs(low), abs(high)) >= float(np.finfo(np.float16).max): raise ValueError('The values do not fit in float16')
+            return cls(codec)
+        nb_levels = np.iinfo(codec).max - (1 if has_nan else 0)
+        return cls(codec, scale=(high - low) / nb_levels if high > low else 1.0, offset=low, nan_code=np.iinfo(codec).max if has_nan else None)
+
+    @classmethod
+    def from_attrs(cls, attrs) -> 'ViewCodec':
+        """ Codec recorded in the attrs of the dataset, None for the float views """
+        if 'codec' not in attrs: return None
+        codec = attrs['codec']
+        codec = codec.decode('utf-8') if isinstance(codec, bytes) else str(codec)
+        return cls(codec, scale=attrs.get('scale', 1.0), offset=attrs.get('offset', 0.0), nan_code=attrs['nan_code'] if 'nan_code' in attrs else None)
+
+    def attrs(self) -> dict:
+        attrs = {'codec': self.codec, 'scale': self.scale, 'offset': self.offset}
+        if self.nan_code is not None: attrs['nan_code'] = self.nan_code
+        return attrs
+
+    def encode(self, data: np.ndarray) -> np.ndarray:
+        if self.codec == 'float16': return data.astype(np.float16)
+        codes = np.round((data - self.offset) / self.scale) if self.codec != 'int8' else data
+        info = np.iinfo(self.codec)
+        high = info.max - 1 if self.nan_code == info.max else info.max # the last code is kept for the nan
+        codes = np.clip(np.nan_to_num(codes, nan=0), info.min, high).astype(self.codec)
+        if self.nan_code is not None: codes[np.isnan(data)] = self.nan_code
+        return codes
+
+    def decode(self, codes: np.ndarray, dtype=np.float32) -> np.ndarray:
+        # straight in dtype, except the uint16 codes in half precision (exact up to 2048 only) decoded in float32 first
+        work_dtype = np.float32 if np.dtype(dtype).itemsize < 4 and self.codec == 'uint16' else dtype
+        values = np.asarray(codes).astype(work_dtype)
+        if self.scale != 1.0: values *= work_dtype(self.scale)
+        if self.offset != 0.0: values += work_dtype(self.offset)
+        if self.nan_code is not None: values[np.asarray(codes) == self.nan_code] = np.nan
+        return values if work_dtype is dtype else values.astype(dtype)
+
+
+class QuantizedArray:
+    """ View matrix kept encoded in memory (or memory mapped) and dequantized on access: indexing it (the rows of a
+        batch) returns the decoded values, so it is used everywhere the float matrix of the view was; rows decodes them
+        straight in the dtype of the dataset reading them (the array is shared by the datasets of the process)
+    """
+    def __init__(self, codes: np.ndarray, codec: ViewCodec, dtype=np.float32):
+        self.codes, self.codec, self.dtype = codes, codec, np.dtype(dtype)
+
+    @property
+    def shape(self) -> tuple:
+        return self.codes.shape
+
+    @property
+    def ndim(self) -> int:
+        return self.codes.ndim
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes
+
+    def __len__(self):
+        return len(self.codes)
+
+    def rows(self, key, dtype=None) -> np.ndarray:
+        return self.codec.decode(self.codes[key], np.dtype(self.dtype if dtype is None else dtype).type)
+
+    def __getitem__(self, key):
+        return self.rows(key)
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.codec.decode(self.codes, self.dtype.type)
+        return values if dtype is None else values.astype(dtype)
+
+
+class CSRArray:
+    """ View matrix kept in CSR (only its non zero values) for the zero heavy views (thresholded cnv): indexing it returns
+        the dense rows like the matrix it replaces, csr_rows the CSR rows (sparse batches, see SparseViews)
+    """
+    def __init__(self, data, dtype=np.float32):
+        self.matrix = sparse.csr_matrix(np.asarray(data, dtype=dtype))
+        self.dtype = self.matrix.dtype
+
+    @property
+    def shape(self) -> tuple:
+        return self.matrix.shape
+
+    @property
+    def ndim(self) -> int:
+        return 2
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.data.nbytes + self.matrix.indices.nbytes + self.matrix.indptr.nbytes
+
+    @property
+    def density(self) -> float:
+        return self.matrix.nnz / max(1, self.shape[0] * self.shape[1])
+
+    def __len__(self):
+        return self.shape[0]
+
+    def csr_rows(self, rows) -> sparse.csr_matrix:
+        return self.matrix[rows]
+
+    def __getitem__(self, key):
+        rows = self.matrix[key].toarray()
+        return rows[0] if np.ndim(key) == 0 else rows
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.matrix.toarray()
+        return values if dtype is None else values.astype(dtype)
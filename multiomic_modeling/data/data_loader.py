@@ -1,18 +1,40 @@
+import os
+import sys
+import json
+import hashlib
+import fcntl
+import tempfile
+import threading
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+import weakref
+from contextlib import contextmanager
+from multiprocessing import shared_memory, resource_tracker
 import pandas as pd
 import numpy as np
 import h5py
+try:
+    import hdf5plugin # registers the lz4 and blosc filters of the compressed view files
+except ImportError:
+    hdf5plugin = None
 import math
 from sklearn.model_selection import train_test_split, StratifiedShuffleSplit
 from sklearn.preprocessing import LabelEncoder, StandardScaler, MinMaxScaler, Normalizer
 from sklearn.utils import class_weight, compute_class_weight
 from copy import deepcopy
 from scipy.stats import median_absolute_deviation
+from scipy import sparse as scipy_sparse
 import torch
-from torch.utils.data import Dataset, random_split, Subset, DataLoader, SubsetRandomSampler, ConcatDataset
+from torch.utils.data import Dataset, IterableDataset, get_worker_info, random_split, Subset, DataLoader, SubsetRandomSampler, ConcatDataset
 from torch.nn.utils.rnn import pad_sequence
 from itertools import combinations
+from collections.abc import Mapping
+from multiomic_modeling.data.structs import CollatedBatch, RaggedViews, SparseViews
+from multiomic_modeling.data.codecs import ViewCodec, QuantizedArray, CSRArray
 
 files_path_on_graham = '/project/6000474/maoss2/tcga_pan_cancer_dataset/data_hdf5'
+cache_dir_path = f'{files_path_on_graham}/dataset_cache'
 class FichierPath:
     cnv_file = f'{files_path_on_graham}/cnv_pancan_tcga_reduced_2000.h5'
     methyl450_file = f'{files_path_on_graham}/methyl_450_pancan_tcga_reduced_2000.h5'
@@ -56,20 +78,109 @@ class FichierPath10K:
     # patients_with_two_or_more_views_file = f'{files_path_on_graham}/patients_with_two_or_more_views.txt'
     # patients_with_all_4_views_available_file = f'{files_path_on_graham}/patients_with_all_4_views_available.txt'
 
+class FichierPathRanked:
+    # one master file per view holding all its features ordered by decreasing MAD (build_data.build_ranked_master_file):
+    # any data size is served as the first data_size columns, instead of a file per data size
+    cnv_file = f'{files_path_on_graham}/cnv_pancan_tcga_ranked.h5'
+    methyl450_file = f'{files_path_on_graham}/methyl_450_pancan_tcga_ranked.h5'
+    mirna_file = f'{files_path_on_graham}/mirna_pancan_tcga_ranked.h5'
+    rna_file = f'{files_path_on_graham}/rna_pancan_tcga_ranked.h5'
+    rna_iso_file = f'{files_path_on_graham}/rna_isoforms_pancan_tcga_ranked.h5'
+    protein_file = f'{files_path_on_graham}/protein_pancan_tcga_ranked.h5'
+    survival_file = f'{files_path_on_graham}/Survival_SupplementalTable_S1_20171025_xena_sp'
+    patients_without_view_file = f'{files_path_on_graham}/patients_a_exclure_car_sans_vues.txt'
+
+class FichierPathContainer:
+    # one file per data size holding all the views aligned on a single patients axis with the labels (build_data.build_multiomic_container):
+    # a view is a group of the file laid out like a view file, the views rows and the encoded labels are read as they are
+    container_file = f'{files_path_on_graham}/multiomic_pancan_tcga_{{data_size}}.h5'
+
 class ReadFiles:
-    def read_h5py(self, fichier: str, normalization: bool = False) -> dict:
-        d = h5py.File(fichier, 'r')
-        data = d['dataset'][()]
+    """ The view files hold its (patients X features) 'dataset' with its 'features_names' and 'patients_names'; with group, the
+        view is read from this group of the file (the views of the multiomic container, see FichierPathContainer)
+    """
+    def read_h5py(self, fichier: str, normalization: bool = False, mmap: bool = False, nb_columns: int = None, group: str = None) -> dict:
+        names = self.read_h5py_names(fichier=fichier, nb_columns=nb_columns, group=group)
+        return {'data': self.read_h5py_data(fichier=fichier, normalization=normalization, mmap=mmap, nb_columns=nb_columns, group=group), 
+                'feature_names': names['feature_names'], 
+                'patient_names': names['patient_names']}
+
+    def read_h5py_data(self, fichier: str, normalization: bool = False, mmap: bool = False, nb_columns: int = None, 
+                       group: str = None) -> np.ndarray:
+        """ Read the view matrix; with nb_columns only its first nb_columns features (ranked master file) are served:
+            a view of the memory map with mmap, a hyperslab read of these columns otherwise.
+            A view stored with a codec (see ViewCodec) stays encoded in a QuantizedArray, dequantized when its rows are fetched.
+        """
+        data = None
+        with h5py.File(fichier, 'r') as d:
+            d = d[group] if group else d
+            codec = ViewCodec.from_attrs(d['dataset'].attrs)
+            offset = self.contiguous_offset(d['dataset'])
+            nb_columns = self.served_columns(d['dataset'], nb_columns)
+            if mmap and not normalization:
+                data = self.memory_map_dataset(fichier=fichier, dataset=d['dataset'], group=group)[:, :nb_columns]
+            elif nb_columns is not None and nb_columns < d['dataset'].shape[1]:
+                data = d['dataset'][:, :nb_columns]
+            elif offset is None:
+                data = d['dataset'][()]
+            else:
+                dtype, shape = d['dataset'].dtype, d['dataset'].shape
+        if data is None:
+            # contiguous dataset: read its bytes directly, without holding the h5py lock, so the views are read concurrently
+            data = np.fromfile(fichier, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+        if codec is not None: 
+            data = codec.decode(data, np.float64) if normalization else QuantizedArray(data, codec)
         if normalization:
             data = StandardScaler().fit_transform(data)
             # data = MinMaxScaler().fit_transform(data)
-        feature_names = np.asarray([el.decode("utf-8") for el in d['features_names'][()]])
-        patient_names = np.asarray([el.decode("utf-8") for el in d['patients_names'][()]])
+        return data
+
+    def read_h5py_names(self, fichier: str, nb_columns: int = None, group: str = None) -> dict:
+        with h5py.File(fichier, 'r') as d:
+            d = d[group] if group else d
+            feature_names = np.char.decode(d['features_names'][:self.served_columns(d['dataset'], nb_columns)].astype(bytes), 'utf-8')
+            patient_names = np.char.decode(d['patients_names'][()].astype(bytes), 'utf-8')
         patient_names = dict(zip(patient_names, np.arange(len(patient_names))))
-        return {'data': data, 
-                'feature_names': feature_names, 
+        return {'feature_names': feature_names, 
                 'patient_names': patient_names}
 
+    @staticmethod
+    def served_columns(dataset: h5py.Dataset, nb_columns: int = None) -> int:
+        """ Number of columns served for nb_columns: at most the stored ones when the file holds all the features of the view
+            (nb_features_view of the ranked master files), a ValueError when nb_columns exceeds the stored features of a cut file
+        """
+        nb_stored = dataset.shape[1]
+        if nb_columns is None: return nb_stored
+        if nb_columns > nb_stored and nb_stored < dataset.attrs.get('nb_features_view', np.inf):
+            raise ValueError(f'{nb_columns} features are asked but the file {dataset.file.filename} only stores the {nb_stored} best ones')
+        return min(nb_columns, nb_stored)
+
+    @staticmethod
+    def contiguous_offset(dataset: h5py.Dataset) -> int:
+        """ Offset of the data in the hdf5 file if it is stored as a single contiguous uncompressed block, None otherwise """
+        if dataset.chunks is not None or dataset.compression is not None: return None
+        return dataset.id.get_offset()
+
+    @staticmethod
+    def memory_map_dataset(fichier: str, dataset: h5py.Dataset, group: str = None) -> np.ndarray:
+        """
+        Open the view matrix as a read-only memory map so that the pages are only read on demand and shared
+        by the OS page cache between the processes (DataLoader workers, optuna trials).
+        A contiguous uncompressed dataset is mapped in place inside the hdf5 file, otherwise a .npy sidecar
+        is written once next to the file (and rebuilt if the hdf5 file is newer) and mapped instead.
+        """
+        offset = ReadFiles.contiguous_offset(dataset)
+        if offset is not None:
+            return np.memmap(fichier, dtype=dataset.dtype, mode='r', offset=offset, shape=dataset.shape)
+        sidecar = f'{os.path.splitext(fichier)[0]}{f"_{group}" if group else ""}_dataset.npy'
+        if not os.path.exists(sidecar) or os.path.getmtime(sidecar) < os.path.getmtime(fichier):
+            try:
+                np.save(f'{sidecar}.tmp.npy', dataset[()])
+                os.replace(f'{sidecar}.tmp.npy', sidecar)
+            except OSError:
+                return dataset[()] # read only storage: fall back to the eager load
+        return np.load(sidecar, mmap_mode='r')
+
     def read_pandas_csv(self, fichier: str):
         return pd.read_csv(fichier, sep='\t')
 
@@ -78,86 +189,488 @@ class ReadFiles:
             lines = [l.strip('\n') for l in f.readlines()] 
         return lines
 
+class LazyView(Mapping):
+    """ View read from its hdf5 file only when needed: the names (feature_names, patient_names) are read on the first
+        access to one of them and the matrix on the first access to 'data', so the analyses that only need the patients
+        availability never read the data. It can be used everywhere the {'data', 'feature_names', 'patient_names'} dict
+        returned by ReadFiles.read_h5py was used.
+        With nb_columns only the first nb_columns features of the file are served (ranked master file), with group the view
+        is the group of the file (multiomic container).
+    """
+    def __init__(self, fichier: str, normalization: bool = False, mmap: bool = False, nb_columns: int = None, group: str = None):
+        self.fichier = fichier
+        self.group = group
+        self.normalization = normalization
+        self.mmap = mmap
+        self.nb_columns = nb_columns
+        self._items = {}
+
+    def set_names(self, feature_names: np.ndarray, patient_names: np.ndarray):
+        """ Set the names already decoded (e.g. from the DatasetStateCache) so they are not read from the file """
+        self._items['feature_names'] = np.asarray(feature_names)
+        self._items['patient_names'] = dict(zip(np.asarray(patient_names), np.arange(len(patient_names))))
+
+    def unload(self):
+        """ Drop the data matrix (it is read again from the file on the next access) """
+        self._items.pop('data', None)
+
+    def load(self, data: bool = True):
+        if 'patient_names' not in self._items: self._items.update(ReadFiles().read_h5py_names(fichier=self.fichier, nb_columns=self.nb_columns, 
+                                                                                                      group=self.group))
+        if data and 'data' not in self._items:
+            self._items['data'] = ReadFiles().read_h5py_data(fichier=self.fichier, normalization=self.normalization, mmap=self.mmap, 
+                                                             nb_columns=self.nb_columns, group=self.group)
+        return self
+
+    @property
+    def shape(self) -> tuple:
+        """ Shape of the data matrix, read from the file metadata if the matrix is not loaded """
+        if 'data' in self._items: return self._items['data'].shape
+        with h5py.File(self.fichier, 'r') as d:
+            return (d[self.dataset_path].shape[0], ReadFiles.served_columns(d[self.dataset_path], self.nb_columns))
+
+    @property
+    def dataset_path(self) -> str:
+        return f'{self.group}/dataset' if self.group else 'dataset'
+
+    def __getitem__(self, key):
+        if key not in ['data', 'feature_names', 'patient_names']: raise KeyError(key)
+        if key not in self._items: self.load(data=key == 'data')
+        return self._items[key]
+
+    def __iter__(self):
+        return iter(['data', 'feature_names', 'patient_names'])
+
+    def __len__(self):
+        return 3
+
+class ViewRegistry:
+    """ Process wide registry of the LazyView objects keyed by (file path, normalization, mmap, nb_columns, group): every dataset built in the
+        process on the same file gets the same view object, so the matrix is read (or mapped) once per process instead of
+        once per dataset (MultiomicDatasetDataAug, the datasets of the analyses built for each views combination).
+        The registry only holds weak references: a view is freed with the last dataset holding it, or earlier when all the
+        datasets which acquired it have released it (MultiomicDatasetNormal.release_views).
+    """
+    _views = {}
+    _lock = threading.RLock() # the weak reference callbacks can run in a collection triggered under the lock
+
+    @staticmethod
+    def key(fichier: str, normalization: bool = False, mmap: bool = False, nb_columns: int = None, group: str = None) -> tuple:
+        return (os.path.abspath(fichier), bool(normalization), bool(mmap), nb_columns, group)
+
+    @classmethod
+    def acquire(cls, fichier: str, normalization: bool = False, mmap: bool = False, nb_columns: int = None, group: str = None) -> LazyView:
+        key = cls.key(fichier, normalization, mmap, nb_columns, group)
+        with cls._lock:
+            view = cls._views[key][0]() if key in cls._views else None
+            if view is None: # never acquired, or collected with the datasets which held it
+                view = LazyView(fichier=fichier, normalization=normalization, mmap=mmap, nb_columns=nb_columns, group=group)
+                cls._views[key] = [weakref.ref(view, lambda ref, key=key: cls.forget(key, ref)), 0]
+            cls._views[key][1] += 1
+            return view
+
+    @classmethod
+    def release(cls, view: LazyView):
+        """ Drop a reference on the view; the last one unregisters it and frees its matrix """
+        key = cls.key(view.fichier, view.normalization, view.mmap, view.nb_columns, view.group)
+        with cls._lock:
+            entry = cls._views.get(key)
+            if entry is None or entry[0]() is not view: return
+            entry[1] -= 1
+            if entry[1] > 0: return
+            del cls._views[key]
+        view.unload()
+
+    @classmethod
+    def references(cls, view: LazyView) -> int:
+        entry = cls._views.get(cls.key(view.fichier, view.normalization, view.mmap, view.nb_columns, view.group))
+        return entry[1] if entry is not None and entry[0]() is view else 0
+
+    @classmethod
+    def forget(cls, key: tuple, ref: weakref.ref):
+        with cls._lock:
+            if key in cls._views and cls._views[key][0] is ref: del cls._views[key]
+
+    @classmethod
+    def clear(cls):
+        """ Forget all the views (their matrices are freed once the datasets holding them are deleted) """
+        with cls._lock:
+            cls._views.clear()
+
 class BuildViews(object):
-    def __init__(self, data_size: int, view_name: str):
+    views_files = {'cnv': 'cnv_file', 'methyl': 'methyl450_file', 'mirna': 'mirna_file', 
+                   'rna_iso': 'rna_iso_file', 'rna': 'rna_file', 'protein': 'protein_file'}
+
+    def __init__(self, data_size: int, view_name: str, mmap: bool = False, lazy: bool = False, ranked: bool = False, 
+                 container: bool = False):
         super(BuildViews, self).__init__()
-        if data_size == 2000: pass
-        if data_size == 5000:
-            FichierPath.cnv_file = FichierPath5K.cnv_file
-            FichierPath.methyl450_file = FichierPath5K.methyl450_file
-            FichierPath.mirna_file = FichierPath5K.mirna_file
-            FichierPath.rna_file = FichierPath5K.rna_file
-            FichierPath.protein_file = FichierPath5K.protein_file
-            # FichierPath.rna_iso_file = FichierPath5K.rna_iso_file
-        if data_size == 10000:
-            FichierPath.cnv_file = FichierPath10K.cnv_file
-            FichierPath.methyl450_file = FichierPath10K.methyl450_file
-            FichierPath.mirna_file = FichierPath10K.mirna_file
-            FichierPath.rna_file = FichierPath10K.rna_file
-            FichierPath.protein_file = FichierPath10K.protein_file
-            # FichierPath.rna_iso_file = FichierPath10K.rna_iso_file
-        if data_size not in [743, 2000, 5000, 10000]: raise ValueError(f'the data size {data_size} is not available in the dataset')
-        if view_name == 'all':
-            self.views = [
-                ReadFiles().read_h5py(fichier=FichierPath.cnv_file, normalization=False), 
-                ReadFiles().read_h5py(fichier=FichierPath.methyl450_file, normalization=False),
-                ReadFiles().read_h5py(fichier=FichierPath.mirna_file, normalization=False),
-                ReadFiles().read_h5py(fichier=FichierPath.rna_file, normalization=False),
-                ReadFiles().read_h5py(fichier=FichierPath.protein_file, normalization=False)
-            ]
-        elif view_name == '3_main_omics':
-            self.views = [
-                ReadFiles().read_h5py(fichier=FichierPath.methyl450_file, normalization=False),
-                ReadFiles().read_h5py(fichier=FichierPath.mirna_file, normalization=False),
-                ReadFiles().read_h5py(fichier=FichierPath.rna_file, normalization=False)
-            ]
-        elif view_name == 'cnv':
-            self.views = [
-                ReadFiles().read_h5py(fichier=FichierPath.cnv_file, normalization=False)
-            ]
-        elif view_name == 'methyl':
-            self.views = [
-                ReadFiles().read_h5py(fichier=FichierPath.methyl450_file, normalization=False)
-            ]
-        elif view_name == 'mirna':
-            self.views = [
-                ReadFiles().read_h5py(fichier=FichierPath.mirna_file, normalization=False)
-            ]
-        elif view_name == 'rna_iso':
-            self.views = [
-                ReadFiles().read_h5py(fichier=FichierPath.rna_iso_file, normalization=True)
-            ]
-        elif view_name == 'rna':
-            self.views = [
-                ReadFiles().read_h5py(fichier=FichierPath.rna_file, normalization=False)
-            ]
-        elif view_name == 'protein':
-            self.views = [
-                ReadFiles().read_h5py(fichier=FichierPath.protein_file, normalization=False)
-            ]
+        self.container_file = None
+        if container:
+            if ranked: raise ValueError('the multiomic container holds the reduced files, it can not serve the ranked master files')
+            self.container_file, self.files_path, nb_columns = FichierPathContainer.container_file.format(data_size=data_size), None, None
+        elif ranked:
+            if data_size <= 0: raise ValueError(f'the data size {data_size} must be positive')
+            self.files_path, nb_columns = FichierPathRanked, data_size
+        else:
+            if data_size not in [743, 2000, 5000, 10000]: raise ValueError(f'the data size {data_size} is not available in the dataset')
+            # the files of the data size are resolved per instance (no global change of FichierPath) so datasets of different sizes can coexist
+            self.files_path, nb_columns = {5000: FichierPath5K, 10000: FichierPath10K}.get(data_size, FichierPath), None
+        if view_name == 'all': self.views_names = ['cnv', 'methyl', 'mirna', 'rna', 'protein']
+        elif view_name == '3_main_omics': self.views_names = ['methyl', 'mirna', 'rna']
+        elif view_name in self.views_files: self.views_names = [view_name]
         else:
             raise ValueError(f'The view {view_name} is not available in the dataset')
+        # the views are shared with the other datasets of the process built on the same files
+        self.views = [ViewRegistry.acquire(fichier=self.view_file(name), normalization=name == 'rna_iso', mmap=mmap, nb_columns=nb_columns,
+                                           group=name if container else None) 
+                      for name in self.views_names]
+        if not lazy: self.load()
+
+    def load(self, max_workers: int = None) -> dict:
+        """ Read the views concurrently in a thread pool (the reads are I/O bound) and return the report of the load
+            {view_name: {'seconds', 'nbytes', 'shape'}} (a view already loaded by another dataset takes no time)
+        """
+        def load_view(view):
+            start = time.perf_counter()
+            view.load()
+            return {'seconds': time.perf_counter() - start, 'nbytes': int(view['data'].nbytes), 'shape': view['data'].shape}
+        with ThreadPoolExecutor(max_workers=max_workers or len(self.views)) as executor:
+            return dict(zip(self.views_names, executor.map(load_view, self.views)))
+
+    def view_file(self, view_name: str) -> str:
+        if self.container_file is not None: return self.container_file
+        attribute = self.views_files[view_name]
+        return getattr(self.files_path, attribute, getattr(FichierPath, attribute)) # rna_iso only exists in the 2k files
         
 class FilterPatientsDataset:
     def filter_patients_with_info(self, views: list, sample_to_labels: dict) -> dict:
-        sample_to_labels_copy = deepcopy(sample_to_labels)
-        # print('original len is', len(list(sample_to_labels.keys())))
-        for name in sample_to_labels.keys():
-            cpt_name = 0
-            for view in views:
-                if name in view['patient_names']: cpt_name += 1
-            if cpt_name != 0: pass
-            else: sample_to_labels_copy.pop(name)
-        # print('final len is', len(list(sample_to_labels_copy.keys())))
-        return sample_to_labels_copy
+        # keep the patients (in the survival file order) available in at least one view
+        names = np.asarray(list(sample_to_labels.keys()))
+        available = np.zeros(len(names), dtype=bool)
+        for view in views:
+            available |= np.isin(names, np.asarray(list(view['patient_names'].keys())))
+        return {name: sample_to_labels[name] for name in names[available]}
+
+class AlignedViewsStore:
+    """ Dense copy of the views aligned once on the patients of the dataset.
+        data is a contiguous (n_patients, n_views, nb_features) array where the views narrower than nb_features
+        (mirna, protein) are already zero padded, and mask is the (n_patients, n_views) availability matrix.
+        With ragged=True data is a (n_patients, sum of the views widths) array holding the views at their true
+        width (view i in the columns views_offsets[i]:views_offsets[i + 1]), without the padding.
+        Fetching a sample is then a single row slice instead of one dict lookup per view.
+    """
+    def __init__(self, views: list, patient_names: np.ndarray, nb_features: int, dtype=np.float32, views_rows: np.ndarray = None, 
+                 ragged: bool = False):
+        self.views_rows = self.align_views(views=views, patient_names=patient_names) if views_rows is None else views_rows
+        self.views_offsets = self.offsets_of(views) if ragged else None
+        self.mask = self.views_rows >= 0
+        self.data = np.zeros(self.store_shape(len(patient_names), views, nb_features, ragged), dtype=dtype)
+        self.fill(views=views, views_rows=self.views_rows)
+
+    @staticmethod
+    def offsets_of(views: list) -> np.ndarray:
+        return np.concatenate([[0], np.cumsum([view.shape[1] for view in views])]).astype(np.int64)
+
+    @staticmethod
+    def store_shape(nb_patients: int, views: list, nb_features: int, ragged: bool = False) -> tuple:
+        if ragged: return (nb_patients, int(sum(view.shape[1] for view in views)))
+        return (nb_patients, len(views), nb_features)
+
+    def fill(self, views: list, views_rows: np.ndarray):
+        for i, view in enumerate(views):
+            available = self.mask[:, i]
+            if self.views_offsets is None:
+                self.data[available, i, :view.shape[1]] = self.view_rows(view['data'], views_rows[available, i], self.data.dtype)
+            else:
+                self.data[available, self.views_offsets[i]:self.views_offsets[i + 1]] = self.view_rows(view['data'], views_rows[available, i], self.data.dtype)
+
+    @staticmethod
+    def view_rows(data, rows: np.ndarray, dtype) -> np.ndarray:
+        """ The rows of a view matrix, a QuantizedArray being decoded straight in dtype (the other ones are cast by the copy) """
+        return data.rows(rows, dtype) if isinstance(data, QuantizedArray) else data[rows]
+
+    @staticmethod
+    def align_views(views: list, patient_names: np.ndarray) -> np.ndarray:
+        """ Return the (n_patients, n_views) matrix of the row of each patient in each view (-1 if the view is missing) """
+        views_rows = np.full((len(patient_names), len(views)), -1, dtype=np.int64)
+        for i, view in enumerate(views):
+            views_rows[:, i] = [view['patient_names'].get(patient_name, -1) for patient_name in patient_names]
+        return views_rows
+
+    def __getitem__(self, idx):
+        return self.data[idx], self.mask[idx].copy()
+
+    def __len__(self):
+        return len(self.data)
+
+class SharedViewsStore(AlignedViewsStore):
+    """ AlignedViewsStore published once in POSIX shared memory (/dev/shm/name) so that the DataLoader workers and the
+        sibling processes (other seeds, optuna trials) built on the same files attach to the same pages instead of
+        holding one copy each. The segment starts with a 64 bytes header holding the number of processes attached to
+        it and a ready flag: the first one creates and fills it (under a file lock) and sets the flag last, the last one
+        to release it unlinks it. A segment found without the flag (its creator was killed during the fill) is rebuilt.
+        A pickled store (spawned DataLoader workers) only carries the segment name and attaches to it without taking
+        a reference, the workers living inside the lifetime of their parent. If a process is killed, the segment stays
+        until the next run on the same files reuses it or it is removed by hand (rm /dev/shm/name).
+    """
+    header_size = 64
+
+    def __init__(self, name: str, views: list, patient_names: np.ndarray, nb_features: int, dtype=np.float32, views_rows: np.ndarray = None, 
+                 ragged: bool = False):
+        self.name = name
+        self.views_offsets = self.offsets_of(views) if ragged else None
+        self.shape = self.store_shape(len(patient_names), views, nb_features, ragged)
+        self.nb_views = len(views)
+        self.dtype = np.dtype(dtype)
+        with self.lock(name):
+            try:
+                self.shm = self.open_segment(name, create=True, size=self.segment_size())
+                created = True
+            except FileExistsError:
+                self.shm = self.open_segment(name)
+                created = False
+                if not self.is_ready(self.shm): # half filled by a creator killed during the fill
+                    self.unlink_segment(self.shm)
+                    self.shm.close()
+                    self.shm = self.open_segment(name, create=True, size=self.segment_size())
+                    created = True
+            self.attach()
+            if created:
+                if views_rows is None: views_rows = self.align_views(views=views, patient_names=patient_names)
+                self.mask[:] = views_rows >= 0
+                self.fill(views=views, views_rows=views_rows)
+                self.shm.buf[8:16] = (1).to_bytes(8, 'little')
+            self.add_reference(self.shm, 1)
+        self.views_rows = views_rows
+        self._finalizer = weakref.finalize(self, SharedViewsStore.release_segment, self.shm, name, os.getpid())
+
+    def segment_size(self) -> int:
+        return self.header_size + self.mask_size() + int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def mask_size(self) -> int:
+        return -(-self.shape[0] * self.nb_views // 64) * 64 # padded to keep the data aligned
+
+    def attach(self):
+        if self.shm.size < self.segment_size():
+            raise ValueError(f'The shared memory segment {self.name} is smaller than the store of shape {self.shape}')
+        self.mask = np.ndarray((self.shape[0], self.nb_views), dtype=bool, buffer=self.shm.buf, offset=self.header_size)
+        self.data = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf, offset=self.header_size + self.mask_size())
+
+    @staticmethod
+    def open_segment(name: str, create: bool = False, size: int = 0) -> shared_memory.SharedMemory:
+        if sys.version_info >= (3, 13): return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+        # before 3.13 every segment is registered in the resource tracker, which would unlink it at the exit of this process
+        shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+    @staticmethod
+    def unlink_segment(shm: shared_memory.SharedMemory):
+        if sys.version_info < (3, 13): resource_tracker.register(shm._name, 'shared_memory') # unlink() unregisters it
+        shm.unlink()
+
+    @staticmethod
+    @contextmanager
+    def lock(name: str):
+        with open(os.path.join(tempfile.gettempdir(), f'{name}.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def is_ready(shm: shared_memory.SharedMemory) -> bool:
+        return int.from_bytes(bytes(shm.buf[8:16]), 'little') == 1
+
+    @staticmethod
+    def add_reference(shm: shared_memory.SharedMemory, value: int) -> int:
+        references = int.from_bytes(bytes(shm.buf[:8]), 'little') + value
+        shm.buf[:8] = references.to_bytes(8, 'little')
+        return references
+
+    @staticmethod
+    def release_segment(shm: shared_memory.SharedMemory, name: str, pid: int):
+        if os.getpid() != pid: return # forked DataLoader workers do not own a reference
+        with SharedViewsStore.lock(name):
+            if SharedViewsStore.add_reference(shm, -1) <= 0: SharedViewsStore.unlink_segment(shm)
+        try:
+            shm.close()
+        except BufferError: # arrays still exported: the mapping is closed when they are collected
+            pass
+
+    def release(self):
+        """ Drop the reference of this process (the segment is unlinked by the last process) """
+        self._finalizer()
+
+    def __getstate__(self):
+        return {'name': self.name, 'shape': self.shape, 'nb_views': self.nb_views, 'dtype': self.dtype.str, 
+                'views_rows': self.views_rows, 'views_offsets': self.views_offsets}
+
+    def __setstate__(self, state: dict):
+        self.name, self.shape, self.nb_views, self.dtype = state['name'], state['shape'], state['nb_views'], np.dtype(state['dtype'])
+        self.views_rows, self.views_offsets = state['views_rows'], state['views_offsets']
+        self.shm = self.open_segment(self.name)
+        self.attach()
+
+class PatientViewIndex:
+    """ Patients x views availability index built from the views rows of a dataset (no feature data is touched).
+        Each patient has a bitmask of its available views (bit i for the view i) and its label, so subset queries
+        like "the test patients with exactly methyl, mirna and rna" or "the patients per cancer with at least 4 views"
+        are vectorized numpy operations.
+        Arguments:
+            mask, np.ndarray, (n_patients, n_views) availability matrix
+            patient_labels, np.ndarray, encoded label of each patient
+            patient_names, np.ndarray, name of each patient
+            views_names, list, name of each view (e.g. ['cnv', 'methyl', 'mirna', 'rna', 'protein'])
+    """
+    def __init__(self, mask: np.ndarray, patient_labels: np.ndarray, patient_names: np.ndarray, views_names: list):
+        mask = np.asarray(mask, dtype=bool)
+        self.views_names = list(views_names)
+        self.patient_labels = np.asarray(patient_labels)
+        self.patient_names = np.asarray(patient_names)
+        self.bitmask = (mask.astype(np.int64) << np.arange(mask.shape[1])).sum(axis=1)
+        self.nb_views = mask.sum(axis=1)
+
+    @classmethod
+    def from_dataset(cls, dataset):
+        return cls(mask=dataset.views_rows >= 0, patient_labels=dataset.all_patient_labels,
+                   patient_names=dataset.all_patient_names, views_names=dataset.views_names)
+
+    @property
+    def mask(self) -> np.ndarray:
+        return (self.bitmask[:, None] >> np.arange(len(self.views_names))) & 1 == 1
+
+    def views_bits(self, views) -> int:
+        """ Bitmask of a view or a list of views given by their names or their positions """
+        if isinstance(views, (str, int, np.integer)): views = [views]
+        bits = 0
+        for view in views:
+            if isinstance(view, str):
+                if view not in self.views_names: raise ValueError(f'The view {view} is not in the index views {self.views_names}')
+                view = self.views_names.index(view)
+            bits |= 1 << int(view)
+        return bits
+
+    def views_of(self, bits: int) -> tuple:
+        return tuple(view for i, view in enumerate(self.views_names) if bits >> i & 1)
+
+    def query(self, indices=None, with_views=None, without_views=None, exact_views=None,
+              nb_views: int = None, min_views: int = None, max_views: int = None, labels=None) -> np.ndarray:
+        """
+        Return the boolean mask (over indices, or over all the patients if indices is None) of the patients matching all the given conditions
+        Arguments:
+            indices, list or np.ndarray, dataset indices to restrict the query to (e.g. the indices of a Subset)
+            with_views, views which must all be available
+            without_views, views which must all be missing
+            exact_views, the exact set of available views
+            nb_views, min_views, max_views, int, conditions on the number of available views
+            labels, list, encoded labels to keep
+        """
+        bitmask, nb, patient_labels = self.bitmask, self.nb_views, self.patient_labels
+        if indices is not None:
+            indices = np.asarray(indices, dtype=np.int64)
+            bitmask, nb, patient_labels = bitmask[indices], nb[indices], patient_labels[indices]
+        keep = np.ones(len(bitmask), dtype=bool)
+        if with_views is not None:
+            bits = self.views_bits(with_views)
+            keep &= (bitmask & bits) == bits
+        if without_views is not None: keep &= (bitmask & self.views_bits(without_views)) == 0
+        if exact_views is not None: keep &= bitmask == self.views_bits(exact_views)
+        if nb_views is not None: keep &= nb == nb_views
+        if min_views is not None: keep &= nb >= min_views
+        if max_views is not None: keep &= nb <= max_views
+        if labels is not None: keep &= np.isin(patient_labels, labels)
+        return keep
+
+    def select(self, indices=None, **query) -> np.ndarray:
+        """ Return the dataset indices of the patients matching the query (see query for the arguments) """
+        keep = self.query(indices=indices, **query)
+        return np.flatnonzero(keep) if indices is None else np.asarray(indices)[keep]
+
+    def positions(self, indices, **query) -> np.ndarray:
+        """ Return the positions in indices (i.e. the Subset indices) of the patients matching the query """
+        return np.flatnonzero(self.query(indices=indices, **query))
+
+    def count(self, indices=None, **query) -> int:
+        return int(self.query(indices=indices, **query).sum())
+
+    def counts_per_label(self, indices=None, **query) -> np.ndarray:
+        """ Number of patients matching the query for each encoded label """
+        patient_labels = self.patient_labels if indices is None else self.patient_labels[np.asarray(indices, dtype=np.int64)]
+        return np.bincount(patient_labels[self.query(indices=indices, **query)], minlength=self.patient_labels.max() + 1)
+
+    def combinations_counts(self, indices=None, **query) -> dict:
+        """ Return {tuple of the available views names: number of patients} for the patients matching the query """
+        bitmask = self.bitmask if indices is None else self.bitmask[np.asarray(indices, dtype=np.int64)]
+        bits, counts = np.unique(bitmask[self.query(indices=indices, **query)], return_counts=True)
+        return {self.views_of(b): int(c) for b, c in zip(bits, counts)}
+
+    def __len__(self):
+        return len(self.bitmask)
+
+class DatasetStateCache:
+    """ On-disk cache of the startup state of MultiomicDatasetNormal (decoded names, filtered and encoded labels,
+        class weights, views rows), one uncompressed .npz per key (no pickle) which loads in a few milliseconds.
+        The key is a content hash of the source files (views and survival file) with the dataset parameters, so the
+        entry changes by itself when one of the input files changes. The checksum of a file is memoized on its
+        (size, mtime) in checksums.json to avoid hashing GBs of hdf5 at every startup.
+    """
+    version = 1
+
+    def __init__(self, cache_dir: str = None):
+        self.cache_dir = cache_dir_path if cache_dir is None else cache_dir
+
+    def file_checksum(self, fichier: str) -> str:
+        memo_file = os.path.join(self.cache_dir, 'checksums.json')
+        memo = {}
+        if os.path.exists(memo_file):
+            with open(memo_file, 'r') as f: memo = json.load(f)
+        stat = os.stat(fichier)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        if fichier in memo and memo[fichier][:2] == signature: return memo[fichier][2]
+        sha = hashlib.sha256()
+        with open(fichier, 'rb') as f:
+            for block in iter(lambda: f.read(2**24), b''): sha.update(block)
+        memo[fichier] = signature + [sha.hexdigest()]
+        self.write_atomically(memo_file, lambda tmp: self.write_json(tmp, memo))
+        return sha.hexdigest()
+
+    def key(self, files: list, **params) -> str:
+        description = {'version': self.version, 'files': [self.file_checksum(fichier) for fichier in files], **params}
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()[:32]
+
+    def load(self, key: str) -> dict:
+        cache_file = os.path.join(self.cache_dir, f'{key}.npz')
+        if not os.path.exists(cache_file): return None
+        with np.load(cache_file) as state:
+            return {name: state[name] for name in state.files}
+
+    def save(self, key: str, state: dict):
+        self.write_atomically(os.path.join(self.cache_dir, f'{key}.npz'), lambda tmp: np.savez(tmp, **state), suffix='.npz')
+
+    @staticmethod
+    def write_json(fichier: str, content: dict):
+        with open(fichier, 'w') as f: json.dump(content, f)
+
+    def write_atomically(self, fichier: str, write, suffix: str = ''):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            write(f'{fichier}.{os.getpid()}.tmp{suffix}')
+            os.replace(f'{fichier}.{os.getpid()}.tmp{suffix}', fichier)
+        except OSError:
+            pass # read only storage: the dataset is simply rebuilt at the next startup
 
 class MultiomicDatasetNormal(Dataset):
-    def __init__(self, data_size: int = 2000, views_to_consider: str = 'all'):
+    def __init__(self, data_size: int = 2000, views_to_consider: str = 'all', dense_store: bool = False, mmap: bool = False,
+                 lazy_views: bool = False, cache: bool = False, cache_dir: str = None, shared_memory: bool = False, 
+                 dtype=np.float32, ragged: bool = False, ranked: bool = False, patient_ids: bool = False, container: bool = False,
+                 sparse: bool = False, density_threshold: float = 0.01):
         super(MultiomicDatasetNormal, self).__init__()
         """
         Arguments:
             data_size: int, 2k; 5k or 10k for the specific patch file to load
-            views_to_consider, str, 
+            views_to_consider, str,
                 all, load all the 4 views (cnv, methyl450, mirna, rna_iso )
                 cnv, load just cnv views
                 methyl, load just methyl450 views
@@ -165,14 +678,122 @@ class MultiomicDatasetNormal(Dataset):
                 mirna, load just mirna views
                 rna, load just rna views
                 protein, load just protein views
+            dense_store, bool, if True align all the views once at construction in an AlignedViewsStore
+                and serve each sample as a row slice of it (faster __getitem__, more memory)
+            mmap, bool, if True keep the views matrices memory mapped on disk instead of loading them in RAM
+            lazy_views, bool, if True a view matrix is only read on its first use (for the analyses which only need
+                the labels and the views availability); keep it False for training so the views are read once before
+                the DataLoader workers are forked
+            cache, bool, if True reuse (or write) the startup state saved in a DatasetStateCache (opt-in: the first run hashes
+                the view files and writes in cache_dir)
+            cache_dir, str, directory of the DatasetStateCache (cache_dir_path if None)
+            shared_memory, bool, if True publish the dense store in POSIX shared memory (SharedViewsStore), shared by the
+                DataLoader workers and by the other processes built on the same files
+            dtype, the dtype of the samples served (float32 by default, the dtype of the models): the views are cast
+                once when they are copied in the sample buffers, no float64 array is built on the way
+            ragged, bool, if True serve the views at their true width in a RaggedViews instead of the (n_views, nb_features)
+                zero padded array (the encoder consumes it directly, RaggedViews.to_padded() rebuilds the padded tensor)
+            ranked, bool, if True read the ranked master files (FichierPathRanked) and serve their first data_size features,
+                any data_size can then be used
+            patient_ids, bool, if True the samples carry the int64 id of the patient (its index in all_patient_names, an int64
+                tensor per batch) instead of its name; decode_patient_ids gives back the names for the reports
+            container, bool, if True read the views, their alignment and the labels from the multiomic container of the data_size
+                (FichierPathContainer) instead of aligning the view files on the survival file (no DatasetStateCache needed)
+            sparse, bool, if True keep a CSR copy (CSRArray, in memory only: the files stay dense) of the views with a density
+                (non zero fraction) below density_threshold and serve the batches in a SparseViews (the encoder embeds it with a 
+                sparse-dense matmul) if the padded batches are below density_threshold too; the density of each view and of the 
+                padded batches is reported in startup_report['density']
+            density_threshold, float, the single threshold of the sparse mode: the views and the batches denser than it stay 
+                dense (the SparseViews carry it, so the encoder follows the decision of the dataset)
         """
-        self.views = BuildViews(data_size=data_size, view_name=views_to_consider).views
+        if sparse and ragged: raise ValueError('the sparse batches already skip the padding, use either sparse or ragged')
+        start = time.perf_counter()
+        build_views = BuildViews(data_size=data_size, view_name=views_to_consider, mmap=mmap, lazy=True, ranked=ranked, container=container)
+        self.views, self.views_names = build_views.views, build_views.views_names
+        self.dtype = np.dtype(dtype)
+        self.patient_ids = patient_ids
+        self.views_offsets = AlignedViewsStore.offsets_of(self.views) if ragged else None
+        self._survival_data = None
+        state, state_key = None, None
+        cache = cache and not container
+        if cache or shared_memory:
+            state_cache = DatasetStateCache(cache_dir=cache_dir)
+            state_key = state_cache.key(files=[view.fichier for view in self.views] + [FichierPath.survival_file], 
+                                        data_size=data_size, views_to_consider=views_to_consider)
+            if cache: state = state_cache.load(state_key)
+        if container:
+            self.restore_container(build_views.container_file)
+        elif state is None:
+            self.build_state()
+            if cache: state_cache.save(state_key, self.cached_state())
+        else:
+            self.restore_state(state)
+        state_source = 'container' if container else 'built' if state is None else 'cache'
+        self.startup_report = {'state': state_source, 'state_seconds': time.perf_counter() - start, 'views': {}}
+        if not lazy_views and not shared_memory: self.startup_report['views'] = build_views.load()
         if views_to_consider == 'mirna': self.nb_features = data_size
-        else: self.nb_features = np.max([view['data'].shape[1] for view in self.views])
+        else: self.nb_features = np.max([view.shape[1] for view in self.views])
+        self.sparse_views, self.density_threshold = {}, density_threshold
+        if sparse and not lazy_views and not shared_memory:
+            self.startup_report['density'] = self.sparsify_views(density_threshold)
+            sparse = self.startup_report['density']['padded'] < density_threshold # denser batches are faster through the dense embedding
+        self.sparse = sparse
+        self.data_len_original = len(self.all_patient_names)
+        self.patient_view_index = PatientViewIndex.from_dataset(self)
+        self.dense_store, self.store_indices = None, None # store_indices: the store row of each patient if they differ
+        if shared_memory:
+            # the views are only read by the process creating the segment
+            self.dense_store = SharedViewsStore(name=f'multiomic_{state_key[:24]}_{self.dtype.name}{"_ragged" if ragged else ""}', 
+                                                views=self.views, patient_names=self.all_patient_names, nb_features=self.nb_features, 
+                                                dtype=self.dtype, views_rows=self.views_rows, ragged=ragged)
+            for view in self.views:
+                if ViewRegistry.references(view) <= 1: view.unload() # still served by another dataset of the process otherwise
+        elif dense_store:
+            self.dense_store = AlignedViewsStore(views=self.views, patient_names=self.all_patient_names,
+                                                 nb_features=self.nb_features, dtype=self.dtype, views_rows=self.views_rows, ragged=ragged)
+        self.startup_report['total_seconds'] = time.perf_counter() - start
+
+    def print_startup_report(self):
+        report = self.startup_report
+        print(f"{len(self)} patients, state {report['state']} in {report['state_seconds']:.2f}s, startup {report['total_seconds']:.2f}s")
+        for view_name, view_report in sorted(report['views'].items(), key=lambda item: -item[1]['seconds']):
+            print(f"  {view_name:>8}: {view_report['shape']} {view_report['nbytes'] / 2**20:.0f} MiB read in {view_report['seconds']:.2f}s")
+        if 'density' in report:
+            print(f"  density of the padded batches {report['density']['padded']:.3f} ({'sparse' if self.sparse else 'dense'} batches), " + 
+                  ', '.join(f"{view_name} {density:.3f}" for view_name, density in report['density']['views'].items()))
+
+    def sparsify_views(self, density_threshold: float = 0.01) -> dict:
+        """ Measure the density (non zero fraction) of each view and keep the ones sparser than density_threshold in CSR in
+            sparse_views (the views of the ViewRegistry are shared with the other datasets, their matrix is never replaced).
+            Return {'views': {view_name: density}, 'padded': density of the (patients, n_views, nb_features) padded batches}
+        """
+        densities, nnz = {}, 0
+        for i, (view_name, view) in enumerate(zip(self.views_names, self.views)):
+            csr = CSRArray(view['data'], dtype=self.dtype)
+            if csr.density < density_threshold:
+                self.sparse_views[i] = csr
+                if ViewRegistry.references(view) <= 1: view.unload() # still served by another dataset of the process otherwise
+            densities[view_name] = csr.density
+            nnz += csr.csr_rows(self.views_rows[self.views_rows[:, i] >= 0, i]).nnz # the patients of the dataset only
+        return {'views': densities, 'padded': float(nnz / max(1, len(self.all_patient_names) * len(self.views) * self.nb_features))}
+
+    def release_views(self):
+        """ Release the views acquired in the ViewRegistry (and the shared memory segment): call it when the dataset is
+            no longer needed so the views not used by another dataset are freed
+        """
+        for view in self.views: ViewRegistry.release(view)
+        if isinstance(self.dense_store, SharedViewsStore): self.dense_store.release()
+
+    @property
+    def survival_data(self) -> pd.DataFrame:
+        if self._survival_data is None: self._survival_data = ReadFiles().read_pandas_csv(fichier=FichierPath.survival_file)
+        return self._survival_data
+
+    def build_state(self):
+        """ Decode the names, filter the patients, encode the labels and align the views (the state kept in the cache) """
         self.feature_names  = []
         for view in self.views:
             self.feature_names.extend(list(view['feature_names']))        
-        self.survival_data = ReadFiles().read_pandas_csv(fichier=FichierPath.survival_file)
         self.sample_to_labels = {self.survival_data['sample'].values[idx]: self.survival_data['cancer type abbreviation'].values[idx] 
                                  for idx, _ in enumerate(self.survival_data['sample'].values)}
         self.sample_to_labels = FilterPatientsDataset().filter_patients_with_info(views=self.views, sample_to_labels=self.sample_to_labels)
@@ -182,13 +803,131 @@ class MultiomicDatasetNormal(Dataset):
         self.all_patient_labels = self.label_encoder.fit_transform(self.all_patient_labels)
         self.class_weights = compute_class_weight(class_weight='balanced',
                                                   classes=np.unique(self.all_patient_labels),
-                                                  y=self.all_patient_labels) 
-        self.data_len_original = len(self.all_patient_names)
+                                                  y=self.all_patient_labels)
+        self.views_rows = AlignedViewsStore.align_views(views=self.views, patient_names=self.all_patient_names)
+
+    def cached_state(self) -> dict:
+        state = {'all_patient_names': self.all_patient_names, 'all_patient_labels': self.all_patient_labels,
+                 'label_classes': self.label_encoder.classes_, 'class_weights': self.class_weights, 'views_rows': self.views_rows}
+        for i, view in enumerate(self.views):
+            state[f'view_{i}_feature_names'] = view['feature_names']
+            state[f'view_{i}_patient_names'] = np.asarray(list(view['patient_names'].keys()))
+        return state
+
+    def restore_state(self, state: dict):
+        for i, view in enumerate(self.views):
+            view.set_names(feature_names=state[f'view_{i}_feature_names'], patient_names=state[f'view_{i}_patient_names'])
+        self.feature_names = [feature_name for view in self.views for feature_name in view['feature_names']]
+        self.all_patient_names = state['all_patient_names']
+        self.all_patient_labels = state['all_patient_labels']
+        self.label_encoder = LabelEncoder()
+        self.label_encoder.classes_ = state['label_classes']
+        self.sample_to_labels = dict(zip(self.all_patient_names, self.label_encoder.inverse_transform(self.all_patient_labels)))
+        self.class_weights = state['class_weights']
+        self.views_rows = state['views_rows']
+
+    def restore_container(self, fichier: str):
+        """ Read the state from the multiomic container: its patients available in at least one of the views of the dataset
+            (in the survival file order, like build_state) with their rows in the views and their labels (encoded again
+            if some cancer types have no patient left)
+        """
+        with h5py.File(fichier, 'r') as d:
+            views_names = list(np.char.decode(d['views_names'][()].astype(bytes), 'utf-8'))
+            missing = [name for name in self.views_names if name not in views_names]
+            if missing: raise ValueError(f'The views {missing} are not in the multiomic container {fichier}')
+            columns = [views_names.index(name) for name in self.views_names]
+            available = d['availability'][()][:, columns].any(axis=1)
+            self.views_rows = d['views_rows'][()][available][:, columns]
+            self.all_patient_names = np.char.decode(d['patients_names'][()].astype(bytes), 'utf-8')[available]
+            labels = np.char.decode(d['label_classes'][()].astype(bytes), 'utf-8')[d['labels'][()][available]]
+        self.label_encoder = LabelEncoder()
+        self.all_patient_labels = self.label_encoder.fit_transform(labels)
+        self.sample_to_labels = dict(zip(self.all_patient_names, labels))
+        self.class_weights = compute_class_weight(class_weight='balanced', classes=np.unique(self.all_patient_labels), y=self.all_patient_labels)
+        self.feature_names = [feature_name for view in self.views for feature_name in view['feature_names']]
+
+    def fetch_batch(self, indices: np.ndarray):
+        """ Return the (batch, n_views, nb_features) data (a RaggedViews if ragged) and the (batch, n_views) mask of the
+            patients at indices with one fancy indexing per view (or a single one with the dense store) instead of one loop per sample
+        """
+        if self.sparse and self.dense_store is None: return self.fetch_sparse_batch(indices)
+        if self.dense_store is not None:
+            store_indices = indices if self.store_indices is None else self.store_indices[indices]
+            data, mask = self.dense_store.data[store_indices], self.dense_store.mask[store_indices]
+        else:
+            views_rows = self.views_rows[indices]
+            mask = views_rows >= 0
+            if self.views_offsets is None: data = np.zeros((len(indices), len(self.views), self.nb_features), dtype=self.dtype)
+            else: data = np.zeros((len(indices), self.views_offsets[-1]), dtype=self.dtype)
+            for i, view in enumerate(self.views):
+                available = mask[:, i]
+                view_data = self.sparse_views[i] if i in self.sparse_views else view['data']
+                if self.views_offsets is None:
+                    data[available, i, :view_data.shape[1]] = AlignedViewsStore.view_rows(view_data, views_rows[available, i], self.dtype)
+                else:
+                    data[available, self.views_offsets[i]:self.views_offsets[i + 1]] = AlignedViewsStore.view_rows(view_data, views_rows[available, i], 
+                                                                                                                 self.dtype)
+        if self.views_offsets is not None: data = RaggedViews(torch.from_numpy(data), self.views_offsets, self.nb_features)
+        if self.sparse: data = SparseViews.from_dense(torch.from_numpy(data), self.density_threshold)
+        return data, mask
+
+    def fetch_sparse_batch(self, indices: np.ndarray):
+        """ fetch_batch of the sparse datasets: the SparseViews is assembled from the CSR rows of the views, the zeros
+            (and the padding) are never materialized
+        """
+        views_rows = self.views_rows[indices]
+        mask = views_rows >= 0
+        rows, columns, values = [], [], []
+        for i, view in enumerate(self.views):
+            available = np.flatnonzero(mask[:, i])
+            if i in self.sparse_views: block = self.sparse_views[i].csr_rows(views_rows[available, i]).tocoo()
+            else: block = scipy_sparse.coo_matrix(AlignedViewsStore.view_rows(view['data'], views_rows[available, i], self.dtype))
+            rows.append(available[block.row] * len(self.views) + i)
+            columns.append(block.col)
+            values.append(block.data.astype(self.dtype, copy=False))
+        data = torch.sparse_coo_tensor(torch.from_numpy(np.vstack([np.concatenate(rows), np.concatenate(columns)]).astype(np.int64)), 
+                                       torch.from_numpy(np.concatenate(values)), (len(indices) * len(self.views), self.nb_features))
+        return SparseViews(data.coalesce(), len(self.views), self.density_threshold), mask
+
+    def patient_keys(self, indices: np.ndarray):
+        """ The patients of a batch: their ids (int64 tensor) in the patient_ids mode, the tuple of their names otherwise """
+        if self.patient_ids: return torch.from_numpy(np.asarray(indices, dtype=np.int64))
+        return tuple(self.all_patient_names[indices])
+
+    def patient_key(self, idx: int):
+        return np.int64(idx) if self.patient_ids else self.all_patient_names[idx]
+
+    @staticmethod
+    def flat_patient_ids(patient_ids) -> np.ndarray:
+        """ The ids (array, tensor or list of batches of ids) as a single int64 array """
+        if isinstance(patient_ids, (list, tuple)) and len(patient_ids) and not np.isscalar(patient_ids[0]):
+            patient_ids = np.concatenate([np.asarray(el) for el in patient_ids])
+        return np.asarray(patient_ids, dtype=np.int64)
+
+    def decode_patient_ids(self, patient_ids) -> np.ndarray:
+        """ Names of the patients from their ids (array, tensor or list of batches of ids) in a single vectorized lookup """
+        return self.all_patient_names[self.flat_patient_ids(patient_ids)]
 
-    def __getitem__(self, idx): 
+    def collated_batch(self, inputs: tuple, indices: np.ndarray) -> CollatedBatch:
+        return CollatedBatch((tuple(torch.from_numpy(el) if isinstance(el, np.ndarray) else el for el in inputs),
+                              torch.from_numpy(self.all_patient_labels[indices]),
+                              self.patient_keys(indices)))
+
+    def __getitems__(self, indices):
+        """ Batched version of __getitem__: return the batch already collated, i.e. ((data, mask), labels, patient_names) """
+        indices = np.asarray(indices)
+        return self.collated_batch(self.fetch_batch(indices), indices)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (list, np.ndarray)): return self.__getitems__(idx)
         patient_name = self.all_patient_names[idx]
         patient_label = self.all_patient_labels[idx]
-        data = np.zeros((len(self.views), self.nb_features)) # nombre_views X nombre_features
+        if self.views_offsets is not None or self.sparse:
+            data, mask = self.fetch_batch(np.array([idx]))
+            return (data if self.sparse else data[0], mask[0]), patient_label, self.patient_key(idx)
+        if self.dense_store is not None:
+            return self.dense_store[idx], patient_label, self.patient_key(idx)
+        data = np.zeros((len(self.views), self.nb_features), dtype=self.dtype) # nombre_views X nombre_features
         for i, view in enumerate(self.views):
             if patient_name in view['patient_names']:
                 try:
@@ -196,32 +935,59 @@ class MultiomicDatasetNormal(Dataset):
                 except ValueError:
                     data[i][:view['data'][view['patient_names'].get(patient_name, 0)].shape[0]] = view['data'][view['patient_names'].get(patient_name, 0)]
         mask = np.array([(patient_name in view['patient_names']) for view in self.views])
-        original_data = data.astype(float)
-        return (original_data, mask), patient_label, patient_name # i add the patient_name because we need it for an analysis downstream
+        original_data = data
+        return (original_data, mask), patient_label, self.patient_key(idx) # i add the patient_name because we need it for an analysis downstream
     
     def __len__(self):
         return len(self.all_patient_names) 
 
 class MultiomicDatasetDataAug(MultiomicDatasetNormal):
-    def __init__(self, train_dataset: torch.utils.data.dataset.Subset, data_size: int = 2000, views_to_consider: str = 'all'):
-        super().__init__(data_size=data_size, views_to_consider=views_to_consider)
+    def __init__(self, train_dataset: torch.utils.data.dataset.Subset, data_size: int = 2000, views_to_consider: str = 'all', mmap: bool = False, 
+                 dtype=np.float32, ranked: bool = False, patient_ids: bool = False, container: bool = False, shared_memory: bool = False):
+        super().__init__(data_size=data_size, views_to_consider=views_to_consider, mmap=mmap, dtype=dtype, ranked=ranked, 
+                         patient_ids=patient_ids, container=container, shared_memory=shared_memory)
         self.train_indices = train_dataset.indices 
         self.train_patient_names = train_dataset.dataset.all_patient_names[train_dataset.indices]
-        for patient_name in self.all_patient_names: 
-            if patient_name not in self.train_patient_names: self.sample_to_labels.pop(patient_name)
-        self.all_patient_names = np.asarray(list(self.sample_to_labels.keys()))
-        self.all_patient_labels = np.asarray(list(self.sample_to_labels.values()))
+        # keep the train patients (in the order of the dataset) with one vectorized membership test
+        train_patients = np.isin(self.all_patient_names, self.train_patient_names)
+        # the patient ids stay the rows of the patients in the full dataset, decoded by the same table as the other batches
+        self.parent_patient_names, self.parent_rows = self.all_patient_names, np.flatnonzero(train_patients)
+        self.all_patient_names = self.all_patient_names[train_patients]
+        labels = self.label_encoder.classes_[self.all_patient_labels[train_patients]]
+        self.sample_to_labels = dict(zip(self.all_patient_names, labels))
         self.label_encoder = LabelEncoder() # i will need this to inverse_tranform afterward i think for the analysis downstream
-        self.all_patient_labels = self.label_encoder.fit_transform(self.all_patient_labels)
+        self.all_patient_labels = self.label_encoder.fit_transform(labels)
         self.data_len_original = len(self.all_patient_names)
+        self.views_rows = self.views_rows[train_patients]
+        # the shared store keeps all the patients (the segment of the full dataset): the train patients are served from their rows
+        if self.dense_store is not None: self.store_indices = self.parent_rows
+        self.patient_view_index = PatientViewIndex.from_dataset(self)
         # Added The 29th of july
         self.augmented_factor_number = int(np.sqrt(math.factorial(len(self.views))))
-        
-    def __getitem__(self, idx): 
+
+    def __getitems__(self, indices):
+        """ Batched version of __getitem__: the views to drop are drawn for the whole batch at once.
+            Return ((data_augmentation, mask, original_data, original_mask), labels, patient_names)
+        """
+        indices = np.asarray(indices) % self.data_len_original
+        original_data, original_mask = self.fetch_batch(indices)
+        nb_views = original_mask.sum(axis=1)
+        # same law as __getitem__: n in [0, nb_views - 2] then n of the available views drawn with replacement are dropped
+        n_views_to_drop = np.floor(np.random.rand(len(indices)) * np.maximum(nb_views - 1, 0)).astype(int)
+        available_views = np.argsort(~original_mask, axis=1, kind='stable') # the available views first, in order
+        picks = np.minimum(np.floor(np.random.rand(*original_mask.shape) * nb_views[:, None]).astype(int), np.maximum(nb_views - 1, 0)[:, None])
+        patients, draws = np.nonzero(np.arange(original_mask.shape[1])[None, :] < n_views_to_drop[:, None])
+        mask = original_mask.copy()
+        mask[patients, np.take_along_axis(available_views, picks, axis=1)[patients, draws]] = False
+        data_augmentation = original_data * mask[:, :, None]
+        return self.collated_batch((data_augmentation, mask, original_data, original_mask), indices)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (list, np.ndarray)): return self.__getitems__(idx)
         idx = idx % self.data_len_original  # pour contrer le fait que la longueur du dataset pourrait etre supérieure à l'idx samplé
         patient_name = self.all_patient_names[idx]
         patient_label = self.all_patient_labels[idx]
-        data = np.zeros((len(self.views), self.nb_features)) # nombre_views X nombre_features
+        data = np.zeros((len(self.views), self.nb_features), dtype=self.dtype) # nombre_views X nombre_features
         for i, view in enumerate(self.views):
             if patient_name in view['patient_names']:
                 try:
@@ -239,28 +1005,240 @@ class MultiomicDatasetDataAug(MultiomicDatasetNormal):
             n_views_to_drop = np.random.choice(nb_views - 1)
             if n_views_to_drop >= 1:
                 mask[np.random.choice(np.flatnonzero(mask), size=n_views_to_drop)] = 0
-        original_data = deepcopy(data.astype(float))
-        data_augmentation = data.astype(float) * mask.reshape(-1, 1) # on met à zéro la vue ou les vues qu'on a dit de drop
-        return (data_augmentation, mask, original_data, original_mask), patient_label, patient_name # i add the patient_name because we need it for an analysis downstream
+        original_data = deepcopy(data)
+        data_augmentation = data * mask.reshape(-1, 1) # on met à zéro la vue ou les vues qu'on a dit de drop
+        return (data_augmentation, mask, original_data, original_mask), patient_label, self.patient_key(idx) # i add the patient_name because we need it for an analysis downstream
     
     def __len__(self):
         # Estimation de la longueur du dataset equivaut à factorial(nbre_de_vues)
         # return len(self.all_patient_names) 
         return len(self.train_patient_names) * int(np.sqrt(math.factorial(len(self.views)))) 
         # return len(self.train_patient_names) * 3
+
+    def patient_keys(self, indices: np.ndarray):
+        return super().patient_keys(self.parent_rows[indices] if self.patient_ids else indices)
+
+    def patient_key(self, idx: int):
+        return np.int64(self.parent_rows[idx]) if self.patient_ids else self.all_patient_names[idx]
+
+    def decode_patient_ids(self, patient_ids) -> np.ndarray:
+        """ Names of the patients from their ids, the rows of the full dataset (same ids as MultiomicDatasetNormal) """
+        return self.parent_patient_names[self.flat_patient_ids(patient_ids)]
                               
+class BatchViewsDropout:
+    """ Views dropout data augmentation applied on collated (data, mask) batches.
+        For each patient with k > 1 available views, n in [0, k - 2] is drawn and n of its available views are drawn with
+        replacement and dropped (same law as MultiomicDatasetDataAug, so less than n views are dropped on a repeated draw),
+        but all the masks of the batch come from a single draw of a generator seeded with (seed, epoch, batch_key), so an
+        epoch is reproducible whatever the number of DataLoader workers.
+    """
+    def __init__(self, seed: int = 42, zero_dropped_views: bool = True):
+        self.seed = seed
+        self.epoch = 0
+        self.zero_dropped_views = zero_dropped_views
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def draw_mask(self, original_mask: torch.Tensor, batch_key: int = 0) -> torch.Tensor:
+        generator = torch.Generator().manual_seed(int(np.random.SeedSequence([self.seed, self.epoch, batch_key]).generate_state(1)[0]))
+        draws = torch.rand((original_mask.shape[0], original_mask.shape[1] + 1), generator=generator)
+        nb_views = original_mask.sum(dim=1)
+        n_views_to_drop = torch.floor(draws[:, 0] * torch.clamp(nb_views - 1, min=0))
+        available_views = (~original_mask).to(torch.int8).argsort(dim=1, stable=True) # the available views first, in order
+        picks = torch.minimum(torch.floor(draws[:, 1:] * nb_views[:, None]).long(), torch.clamp(nb_views - 1, min=0)[:, None])
+        dropped = torch.arange(original_mask.shape[1])[None, :] < n_views_to_drop[:, None]
+        dropped = torch.zeros(original_mask.shape).scatter_add_(1, available_views.gather(1, picks), dropped.float()) > 0
+        return original_mask & ~dropped
+
+    def __call__(self, data: torch.Tensor, original_mask: torch.Tensor, batch_key: int = 0) -> tuple:
+        """ Return (data_augmentation, mask, original_data, original_mask); the original tensors are not copied """
+        mask = self.draw_mask(original_mask, batch_key=batch_key)
+        if not self.zero_dropped_views: data_augmentation = data
+        elif isinstance(data, (RaggedViews, SparseViews)): data_augmentation = data.masked(mask)
+        else: data_augmentation = data * mask[:, :, None].to(data.dtype)
+        return data_augmentation, mask, data, original_mask
+
+class MultiomicDatasetBatchAug(Dataset):
+    """ Replacement of MultiomicDatasetDataAug working on the train split of an already built dataset (no reload).
+        Each epoch goes augmented_passes times over the train patients; the batches are fetched with __getitems__
+        and augmented with BatchViewsDropout, with the same output as MultiomicDatasetDataAug:
+        ((data_augmentation, mask, original_data, original_mask), labels, patient_names)
+    """
+    def __init__(self, train_dataset: torch.utils.data.dataset.Subset, augmented_passes: int = None, seed: int = 42,
+                 zero_dropped_views: bool = True):
+        super(MultiomicDatasetBatchAug, self).__init__()
+        self.dataset, self.train_indices = train_dataset, np.arange(len(train_dataset))
+        while isinstance(self.dataset, Subset):
+            self.train_indices = np.asarray(self.dataset.indices)[self.train_indices]
+            self.dataset = self.dataset.dataset
+        if augmented_passes is None: augmented_passes = int(np.sqrt(math.factorial(len(self.dataset.views))))
+        self.augmented_passes = augmented_passes
+        self.views_dropout = BatchViewsDropout(seed=seed, zero_dropped_views=zero_dropped_views)
+
+    def set_epoch(self, epoch: int):
+        self.views_dropout.set_epoch(epoch)
+
+    def __getitems__(self, indices):
+        indices = np.asarray(indices)
+        (data, original_mask), patient_labels, patient_names = self.dataset.__getitems__(self.train_indices[indices % len(self.train_indices)])
+        inputs = self.views_dropout(data, original_mask, batch_key=int(indices[0]))
+        return CollatedBatch((inputs, patient_labels, patient_names))
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (list, np.ndarray)): return self.__getitems__(idx)
+        inputs, patient_labels, patient_names = self.__getitems__([idx])
+        return tuple(el[0] for el in inputs), patient_labels[0], patient_names[0]
+
+    def __len__(self):
+        return len(self.train_indices) * self.augmented_passes
+
+class StreamingMultiomicDataset(IterableDataset):
+    """ Out-of-core version of a MultiomicDatasetNormal (or of a Subset of it) for views too large for the RAM: the samples
+        are read from the hdf5 files by chunks of chunk_size patients in a background thread (prefetch_chunks chunks read
+        ahead) and shuffled in a buffer of buffer_size samples, the chunk order being shuffled at each epoch.
+        The chunks follow the rows order of the widest view so each one is read as a few contiguous hyperslabs.
+        The memory used is bounded by (buffer_size + (prefetch_chunks + 2) * chunk_size) samples whatever the data size.
+        It yields the batches already collated, i.e. ((data, mask), labels, patient_names) like __getitems__, so it is
+        iterated with batch_size=None (c_dataloader does it); with DataLoader workers each one streams its share of the chunks.
+    """
+    def __init__(self, dataset, batch_size: int = 32, chunk_size: int = 256, buffer_size: int = 2048, prefetch_chunks: int = 2, 
+                 shuffle: bool = True, seed: int = 42):
+        super(StreamingMultiomicDataset, self).__init__()
+        self.dataset, self.indices = dataset, np.arange(len(dataset))
+        while isinstance(self.dataset, Subset):
+            self.indices = np.asarray(self.dataset.indices)[self.indices]
+            self.dataset = self.dataset.dataset
+        if any(view.normalization for view in self.dataset.views): 
+            raise ValueError('the normalized views (rna_iso) need the whole matrix and cannot be streamed')
+        self.batch_size, self.chunk_size, self.buffer_size, self.prefetch_chunks = batch_size, chunk_size, buffer_size, prefetch_chunks
+        self.shuffle, self.seed, self.epoch = shuffle, seed, 0
+        self.views_widths = [view.shape[1] for view in self.dataset.views]
+        widest = int(np.argmax(self.views_widths))
+        rows = self.dataset.views_rows[self.indices, widest]
+        self.indices = self.indices[np.argsort(np.where(rows >= 0, rows, np.iinfo(rows.dtype).max), kind='stable')]
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def chunks(self) -> list:
+        chunks = [self.indices[start:start + self.chunk_size] for start in range(0, len(self.indices), self.chunk_size)]
+        if self.shuffle: chunks = [chunks[i] for i in np.random.RandomState([self.seed, self.epoch]).permutation(len(chunks))]
+        worker = get_worker_info()
+        if worker is not None: chunks = chunks[worker.id::worker.num_workers]
+        return chunks
+
+    @staticmethod
+    def read_rows(dataset: h5py.Dataset, rows: np.ndarray, nb_columns: int) -> np.ndarray:
+        """ Read the first nb_columns columns of the (unique) rows of the hdf5 dataset in the given order: a single hyperslab
+            if they are dense enough in the file, a hyperslab per row for a chunked dataset (only the chunks of these
+            patients are read, see create_view_dataset), an increasing point selection otherwise
+        """
+        if len(rows) == 0: return np.zeros((0, nb_columns), dtype=dataset.dtype)
+        start, stop = rows.min(), rows.max() + 1
+        if stop - start <= 2 * len(rows): return dataset[start:stop, :nb_columns][rows - start]
+        if dataset.chunks is not None: return np.stack([dataset[row, :nb_columns] for row in rows])
+        order = np.argsort(rows)
+        values = np.empty((len(rows), nb_columns), dtype=dataset.dtype)
+        values[order] = dataset[rows[order], :nb_columns]
+        return values
+
+    def read_chunk(self, files: list, indices: np.ndarray) -> tuple:
+        """ Same output as MultiomicDatasetNormal.fetch_batch, read from the opened hdf5 files """
+        dataset = self.dataset
+        views_rows = dataset.views_rows[indices]
+        mask = views_rows >= 0
+        if dataset.views_offsets is None: data = np.zeros((len(indices), len(files), dataset.nb_features), dtype=dataset.dtype)
+        else: data = np.zeros((len(indices), dataset.views_offsets[-1]), dtype=dataset.dtype)
+        for i, d in enumerate(files):
+            available = mask[:, i]
+            values = self.read_rows(d[dataset.views[i].dataset_path], views_rows[available, i], nb_columns=self.views_widths[i])
+            codec = ViewCodec.from_attrs(d[dataset.views[i].dataset_path].attrs)
+            if codec is not None: values = codec.decode(values, dataset.dtype.type)
+            if dataset.views_offsets is None: data[available, i, :values.shape[1]] = values
+            else: data[available, dataset.views_offsets[i]:dataset.views_offsets[i + 1]] = values
+        return indices, data, mask
+
+    def prefetch(self, chunks: list, chunks_queue: queue.Queue, stop: threading.Event):
+        def put(item):
+            while not stop.is_set():
+                try:
+                    chunks_queue.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+        try:
+            files = [h5py.File(view.fichier, 'r') for view in self.dataset.views]
+            try:
+                for indices in chunks:
+                    if stop.is_set(): break
+                    put(self.read_chunk(files, indices))
+            finally:
+                for d in files: d.close()
+            put(None)
+        except Exception as e:
+            put(e)
+
+    def stream_chunks(self, chunks: list):
+        chunks_queue, stop = queue.Queue(maxsize=self.prefetch_chunks), threading.Event()
+        reader = threading.Thread(target=self.prefetch, args=(chunks, chunks_queue, stop), daemon=True)
+        reader.start()
+        try:
+            while True:
+                chunk = chunks_queue.get()
+                if chunk is None: return
+                if isinstance(chunk, Exception): raise chunk
+                yield chunk
+        finally:
+            stop.set()
+            reader.join()
+
+    def collate(self, indices: np.ndarray, data: np.ndarray, mask: np.ndarray) -> CollatedBatch:
+        if self.dataset.views_offsets is not None: data = RaggedViews(torch.from_numpy(data), self.dataset.views_offsets, self.dataset.nb_features)
+        return self.dataset.collated_batch((data, mask), indices)
+
+    def __iter__(self):
+        worker = get_worker_info()
+        rng = np.random.RandomState([self.seed, self.epoch, 0 if worker is None else worker.id + 1])
+        buffer = None
+        for chunk in self.stream_chunks(self.chunks()):
+            buffer = chunk if buffer is None else tuple(np.concatenate([b, c]) for b, c in zip(buffer, chunk))
+            if len(buffer[0]) < self.buffer_size: continue
+            # keep half of the buffer to mix it with the next chunks
+            if self.shuffle: buffer = tuple(el[order] for order in [rng.permutation(len(buffer[0]))] for el in buffer)
+            nb_out = (len(buffer[0]) - self.buffer_size // 2) // self.batch_size * self.batch_size
+            for start in range(0, nb_out, self.batch_size):
+                yield self.collate(*(el[start:start + self.batch_size] for el in buffer))
+            buffer = tuple(el[nb_out:] for el in buffer)
+        if buffer is None: return
+        if self.shuffle: buffer = tuple(el[order] for order in [rng.permutation(len(buffer[0]))] for el in buffer)
+        for start in range(0, len(buffer[0]), self.batch_size):
+            yield self.collate(*(el[start:start + self.batch_size] for el in buffer))
+
+    def __len__(self):
+        # number of batches without DataLoader workers (each worker may end with one more partial batch)
+        return int(np.ceil(len(self.indices) / self.batch_size))
+
 class MultiomicDatasetBuilder:
+    @staticmethod
+    def multiomic_data_aug_batch_builder(train_dataset, augmented_passes: int = None, seed: int = 42):
+        return MultiomicDatasetBatchAug(train_dataset=train_dataset, augmented_passes=augmented_passes, seed=seed)
+
+    @staticmethod
+    def subset_labels(subset: Subset) -> np.ndarray:
+        """ Labels of the samples of the subset read from the labels vector of its dataset (no sample is materialized).
+            The index of an augmented dataset sample is the patient index modulo data_len_original.
+        """
+        indices = np.asarray(subset.indices)
+        dataset = subset.dataset
+        return dataset.all_patient_labels[indices % len(dataset.all_patient_labels)]
+
     @staticmethod
     def multiomic_data_aug_builder(augmented_dataset):
-        labels = [augmented_dataset[i][-1] for i in augmented_dataset.train_indices]
-        # It's taking an astronomical much of time so i choose 3 to accelerate the code and see the results. 
-        # It's supposed to be 10 for the next opération
-        nb_of_times_len_data_was_multiplied = int(np.sqrt(math.factorial(len(augmented_dataset.views)))) 
-        # nb_of_times_len_data_was_multiplied = 3
-        new_labels = []
-        for _ in range(nb_of_times_len_data_was_multiplied): new_labels.extend(labels)
-        labels = new_labels
-        new_train_dataset = Subset(augmented_dataset, indices=np.arange(len(labels)))
+        # index only: a Subset over range(len(augmented_dataset)), no sample is fetched (the labels of the subset are
+        # given by subset_labels)
+        indices = np.arange(len(augmented_dataset))
+        new_train_dataset = Subset(augmented_dataset, indices=indices)
         return new_train_dataset
     
     @staticmethod        
@@ -0,0 +1,118 @@
+import os
+import numpy as np
+import pandas as pd
+import multiprocessing
+from multiprocessing import shared_memory
+from scipy.stats import median_abs_deviation
+from sklearn.feature_selection import mutual_info_classif, f_classif
+
+
+class FeatureScorers:
+    """ The scorers of the FeatureScoringEngine: scorer(block, labels, discrete) -> one score per column of the (patients X
+        features) block, the higher the better. The label aware scorers get the cancer type of each patient in labels,
+        discrete tells if the whole matrix (not only the block) holds integer values, so all its blocks are scored alike.
+        A new scorer is added with FeatureScorers.register(name, scorer, label_aware).
+    """
+    @staticmethod
+    def mad(block: np.ndarray, labels: np.ndarray = None, discrete: bool = False) -> np.ndarray:
+        return median_abs_deviation(block, axis=0)
+
+    @staticmethod
+    def variance(block: np.ndarray, labels: np.ndarray = None, discrete: bool = False) -> np.ndarray:
+        return np.var(block, axis=0)
+
+    @staticmethod
+    def mutual_info(block: np.ndarray, labels: np.ndarray = None, discrete: bool = False) -> np.ndarray:
+        # integer valued features (thresholded cnv) are scored as discrete: a contingency table instead of the nearest neighbours estimate
+        return mutual_info_classif(block, labels, discrete_features=discrete, random_state=42)
+
+    @staticmethod
+    def anova(block: np.ndarray, labels: np.ndarray = None, discrete: bool = False) -> np.ndarray:
+        return np.nan_to_num(f_classif(block, labels)[0], nan=0.0) # constant features have no F statistic
+
+    scorers = {'mad': (mad.__func__, False), 'variance': (variance.__func__, False),
+               'mutual_info': (mutual_info.__func__, True), 'anova': (anova.__func__, True)}
+
+    @classmethod
+    def register(cls, name: str, scorer, label_aware: bool = False):
+        cls.scorers[name] = (scorer, label_aware)
+
+    @classmethod
+    def get(cls, name: str):
+        if name not in cls.scorers: raise ValueError(f'The scorer {name} is not available: choose between {list(cls.scorers)}')
+        return cls.scorers[name]
+
+
+_shared_block = {}
+
+def _attach_shared_data(name: str, shape: tuple, dtype: str, labels: np.ndarray, discrete: bool):
+    shm = shared_memory.SharedMemory(name=name) # the workers share the resource tracker of the parent, which unlinks the segment
+    _shared_block.update(shm=shm, data=np.ndarray(shape, dtype=dtype, buffer=shm.buf), labels=labels, discrete=discrete)
+
+def _score_columns(scorer_name: str, start: int, stop: int) -> np.ndarray:
+    scorer, _ = FeatureScorers.get(scorer_name)
+    return scorer(np.ascontiguousarray(_shared_block['data'][:, start:stop]), _shared_block['labels'], _shared_block['discrete'])
+
+
+class FeatureScoringEngine:
+    """ Score the features (columns) of a (patients X features) matrix by blocks of block_size columns on a pool of
+        nb_workers processes. The matrix is copied once in a shared memory segment read by all the workers (no copy of
+        the data per task). The scores are saved with save_scores so the files of new sizes are cut without rescoring.
+    """
+    def __init__(self, scorer: str = 'mad', nb_workers: int = 1, block_size: int = 1024):
+        FeatureScorers.get(scorer)
+        self.scorer, self.nb_workers, self.block_size = scorer, nb_workers, block_size
+
+    @property
+    def label_aware(self) -> bool:
+        return FeatureScorers.get(self.scorer)[1]
+
+    def score(self, data: np.ndarray, labels: np.ndarray = None) -> np.ndarray:
+        """
+        Arguments:
+            data, (patients X features) array
+            labels, the label of each patient (for the label aware scorers, the patients without label must be removed)
+        Return:
+            the score of each feature
+        """
+        if self.label_aware and labels is None: raise ValueError(f'The scorer {self.scorer} needs the labels of the patients')
+        blocks = [(start, min(start + self.block_size, data.shape[1])) for start in range(0, data.shape[1], self.block_size)]
+        discrete = all(bool(np.all(data[:, start:stop] == np.round(data[:, start:stop]))) for start, stop in blocks)
+        if self.nb_workers <= 1 or multiprocessing.current_process().daemon: # a worker of a pool can not start its own pool
+            scorer, _ = FeatureScorers.get(self.scorer)
+            return np.concatenate([scorer(np.ascontiguousarray(data[:, start:stop]), labels, discrete) for start, stop in blocks])
+        shm = shared_memory.SharedMemory(create=True, size=max(1, data.nbytes))
+        try:
+            np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[:] = data
+            with multiprocessing.Pool(processes=self.nb_workers, initializer=_attach_shared_data,
+                                      initargs=(shm.name, data.shape, data.dtype.str, labels, discrete)) as pool:
+                scores = pool.starmap(_score_columns, [(self.scorer, start, stop) for start, stop in blocks])
+        finally:
+            shm.close()
+            shm.unlink()
+        return np.concatenate(scores)
+
+    @staticmethod
+    def rank(scores: np.ndarray, nb_features: int = None) -> np.ndarray:
+        """ Indices of the nb_features best features, best first (ties kept in the file order) """
+        return np.argsort(-scores, kind='stable')[:nb_features]
+
+    @staticmethod
+    def save_scores(fichier: str, scores: np.ndarray, features_names: np.ndarray, scorer: str):
+        np.savez(f'{fichier}.tmp.npz', scores=scores, features_names=np.asarray(features_names, dtype=str), scorer=scorer)
+        os.replace(f'{fichier}.tmp.npz', fichier)
+
+    @staticmethod
+    def load_scores(fichier: str, features_names: np.ndarray, scorer: str) -> np.ndarray:
+        """ The scores saved in fichier if they were computed with this scorer on these features, None otherwise """
+        if not os.path.exists(fichier): return None
+        with np.load(fichier) as saved:
+            if str(saved['scorer']) != scorer or not np.array_equal(saved['features_names'], np.asarray(features_names, dtype=str)): return None
+            return saved['scores']
+
+
+def patients_labels(patients_names: np.ndarray, survival_file: str) -> np.ndarray:
+    """ Cancer type of each patient read from the survival table ('' for the patients not in it) """
+    survival_data = pd.read_csv(survival_file, sep='\t')
+    sample_to_labels = dict(zip(survival_data['sample'].values, survival_data['cancer type abbreviation'].values))
+    return np.asarray([sample_to_labels.get(name, '') for name in patients_names], dtype=str)
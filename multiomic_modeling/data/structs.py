@@ -119,5 +119,158 @@ class Sequence(TransferableDataType):
             yield seqs[i:i+batch_size]
 
 
+class RaggedViews(TransferableDataType):
+    """ Views of a sample (data of shape (total_width,)) or of a batch (data of shape (batch, total_width)) stored one
+        after the other at their true width instead of being zero padded to nb_features: the view i is
+        data[..., offsets[i]:offsets[i + 1]]. to_padded() builds the (..., n_views, nb_features) tensor for the callers
+        which need it.
+    """
+    def __init__(self, data, offsets, nb_features=None):
+        self.data = data
+        self.offsets = [int(el) for el in offsets]
+        self.nb_features = max(self.widths) if nb_features is None else int(nb_features)
+
+    @property
+    def widths(self):
+        return [end - start for start, end in zip(self.offsets[:-1], self.offsets[1:])]
+
+    @property
+    def nb_views(self):
+        return len(self.offsets) - 1
+
+    def view(self, i):
+        return self.data[..., self.offsets[i]:self.offsets[i + 1]]
+
+    def to_padded(self, nb_features=None):
+        nb_features = self.nb_features if nb_features is None else nb_features
+        padded = self.data.new_zeros(self.data.shape[:-1] + (self.nb_views, nb_features))
+        for i, width in enumerate(self.widths):
+            padded[..., i, :width] = self.view(i)
+        return padded
+
+    def masked(self, mask):
+        """ Return the views with the ones where mask (..., n_views) is False set to zero """
+        widths = torch.tensor(self.widths, device=self.data.device)
+        return RaggedViews(self.data * torch.repeat_interleave(mask.to(self.data.dtype), widths, dim=-1), self.offsets, self.nb_features)
+
+    def __getitem__(self, item):
+        return RaggedViews(self.data[item], self.offsets, self.nb_features)
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def device(self):
+        return self.data.device
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    def to(self, device, **kwargs):
+        self.data = self.data.to(device, **kwargs)
+        return self
+
+    def cuda(self):
+        return self.to('cuda:0')
+
+    def cpu(self):
+        return self.to('cpu')
+
+    @property
+    def batch_size(self):
+        return 0 if len(self.data.shape) == 1 else self.data.shape[0]
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    @classmethod
+    def collate_fn(cls, views_list):
+        assert all([v.batch_size == 0 for v in views_list]), "Can't collate batches together"
+        first = views_list[0]
+        return RaggedViews(torch.stack([v.data for v in views_list], 0), first.offsets, first.nb_features)
+
+
+class SparseViews(TransferableDataType):
+    """ Views of a batch kept sparse: data is a sparse COO tensor of shape (batch * n_views, nb_features) where the row
+        b * n_views + i holds the non zero values of the view i of the sample b. The encoder multiplies it into the view
+        embedding with a single sparse-dense matmul; to_padded() builds the (batch, n_views, nb_features) tensor.
+        density_threshold is the one of the dataset serving the batch: a batch denser than it goes through the dense embedding.
+    """
+    def __init__(self, data, nb_views, density_threshold=None):
+        self.data = data
+        self.nb_views = int(nb_views)
+        self.density_threshold = density_threshold
+
+    @classmethod
+    def from_dense(cls, padded, density_threshold=None):
+        """ From the (batch, n_views, nb_features) padded tensor """
+        return cls(padded.reshape(-1, padded.shape[-1]).to_sparse(), padded.shape[1], density_threshold)
+
+    @property
+    def nb_features(self):
+        return self.data.shape[1]
+
+    @property
+    def density(self):
+        return self.data._nnz() / max(1, self.data.shape[0] * self.data.shape[1])
+
+    @property
+    def too_dense(self):
+        return self.density_threshold is not None and self.density > self.density_threshold
+
+    def to_padded(self, nb_features=None):
+        padded = self.data.to_dense().reshape(self.batch_size, self.nb_views, self.nb_features)
+        if nb_features is None or nb_features == self.nb_features: return padded
+        return torch.nn.functional.pad(padded, (0, nb_features - self.nb_features))
+
+    def masked(self, mask):
+        """ Return the views with the ones where mask (batch, n_views) is False set to zero """
+        data = self.data.coalesce()
+        keep = mask.reshape(-1)[data.indices()[0]]
+        return SparseViews(torch.sparse_coo_tensor(data.indices()[:, keep], data.values()[keep], data.shape), self.nb_views, self.density_threshold)
+
+    @property
+    def shape(self):
+        return (self.batch_size, self.nb_views, self.nb_features)
+
+    @property
+    def device(self):
+        return self.data.device
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    def to(self, device, **kwargs):
+        self.data = self.data.to(device, **kwargs)
+        return self
+
+    def cuda(self):
+        return self.to('cuda:0')
+
+    def cpu(self):
+        return self.to('cpu')
+
+    @property
+    def batch_size(self):
+        return self.data.shape[0] // self.nb_views
+
+    def __len__(self):
+        return self.batch_size
+
+    @classmethod
+    def collate_fn(cls, views_list):
+        return SparseViews(torch.cat([v.data for v in views_list], 0), views_list[0].nb_views, views_list[0].density_threshold)
+
+
+class CollatedBatch(tuple):
+    """ A batch already collated by the dataset itself (see MultiomicDatasetNormal.__getitems__).
+        The collate functions must let it through untouched.
+    """
+    pass
+
+
 if __name__ == '__main__':
     pass
\ No newline at end of file
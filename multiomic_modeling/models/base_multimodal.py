@@ -16,7 +16,7 @@ from pytorch_lightning.callbacks import ModelCheckpoint, EarlyStopping
 
 from multiomic_modeling import logging
 from multiomic_modeling.torch_utils import totensor, get_optimizer
-from multiomic_modeling.models.utils import c_collate
+from multiomic_modeling.models.utils import c_collate, c_dataloader
 from multiomic_modeling.loss_and_metrics import SeqCrossEntropyLoss, SeqLabelSmoothingLoss, _adjust_shapes
 from multiomic_modeling.data.structs import Sequence
 
@@ -167,13 +167,18 @@ class BaseMultiModalTrainer(LightningModule):
         # print(result)
         return result
 
+    def on_train_epoch_start(self):
+        # reseed the batch level data augmentation (MultiomicDatasetBatchAug) before the workers are started
+        if hasattr(self._train_dataset, 'set_epoch'):
+            self._train_dataset.set_epoch(self.current_epoch)
+
     def train_dataloader(self):
         bs = self.batch_size
-        return DataLoader(self._train_dataset, batch_size=bs, shuffle=True, collate_fn=c_collate, num_workers=4)
+        return c_dataloader(self._train_dataset, batch_size=bs, shuffle=True, num_workers=4)
 
     def val_dataloader(self):
         bs = self.batch_size
-        return DataLoader(self._valid_dataset, batch_size=bs, shuffle=True, collate_fn=c_collate, num_workers=4)
+        return c_dataloader(self._valid_dataset, batch_size=bs, shuffle=True, num_workers=4)
 
     def fit(self, train_dataset=None, valid_dataset=None, artifact_dir=None, nb_ckpts=1, verbose=0, **kwargs):
         self._train_dataset, self._valid_dataset = train_dataset, valid_dataset
@@ -225,7 +230,7 @@ class BaseMultiModalTrainer(LightningModule):
         return self
 
     def predict(self, dataset=None):
-        ploader = DataLoader(dataset, collate_fn=c_collate, batch_size=32)
+        ploader = c_dataloader(dataset, batch_size=32)
         res = [self.network.predict(x[0]).data.numpy() for x in ploader]    # supposing that the first
         return np.concatenate(res, axis=0)
 
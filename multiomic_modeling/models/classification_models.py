@@ -113,15 +113,15 @@ class BaseAlgoTemplate():
                                                                                                            random_state=random_state)
         train_loader = DataLoader(train_dataset, batch_size=len(train_dataset))
         train_dataset_array = next(iter(train_loader))[0][0].numpy()
-        train_dataset_array_labels = next(iter(train_loader))[1].numpy()
+        train_dataset_array_labels = MultiomicDatasetBuilder.subset_labels(train_dataset)
         
         test_loader = DataLoader(test_dataset, batch_size=len(test_dataset))
         x_test = next(iter(test_loader))[0][0].numpy()
-        y_test = next(iter(test_loader))[1].numpy()
+        y_test = MultiomicDatasetBuilder.subset_labels(test_dataset)
         
         valid_loader = DataLoader(valid_dataset, batch_size=len(valid_dataset))
         valid_dataset_array = next(iter(valid_loader))[0][0].numpy()
-        valid_dataset_array_labels = next(iter(valid_loader))[1].numpy()
+        valid_dataset_array_labels = MultiomicDatasetBuilder.subset_labels(valid_dataset)
         
         x_train = np.vstack((train_dataset_array, valid_dataset_array))
         y_train = np.hstack((train_dataset_array_labels, valid_dataset_array_labels))
@@ -35,12 +35,13 @@ class DNNDataset(Dataset):
     def __init__(self, 
                  data_size: int = 2000, 
                  views_to_consider: str = 'all', 
-                 random_state: int = 42):
+                 random_state: int = 42,
+                 dtype=np.float32):
         super().__init__()
         x_train, y_train, x_test, y_test, feature_names = BaseAlgoTemplate.reload_dataset(data_size=data_size, 
                                                                                           dataset_views_to_consider=views_to_consider,
                                                                                           random_state=random_state)
-        self.data = np.vstack((x_train, x_test))
+        self.data = np.vstack((x_train, x_test)).astype(dtype, copy=False)
         self.labels = self.all_patient_labels = np.hstack((y_train, y_test))
         self._len_train = 8820
         self._len_test = 2451
@@ -98,8 +99,9 @@ class DNN(Model):
         return self.__output_dim
        
     def forward(self, inputs) -> torch.Tensor:
-        output = self.dnn(inputs).float()
-        return output
+        dtype = self.dnn[0][0].weight.dtype
+        if inputs.dtype != dtype: inputs = inputs.to(dtype)
+        return self.dnn(inputs)
     
     def predict(self, inputs):
         return self(inputs)
@@ -126,7 +128,7 @@ class DNNTrainer(MultiomicTrainer):
             
     def train_val_step(self, batch, optimizer_idx=0, train=True):
         xs, ys = batch
-        ys_pred = self.network(xs.float())
+        ys_pred = self.network(xs)
         loss_metrics = self.network.compute_loss_metrics(ys_pred, ys)
         prefix = 'train_' if train else 'val_'
         for key, value in loss_metrics.items():
@@ -171,7 +173,7 @@ class DNNTrainer(MultiomicTrainer):
         self.load_average_weights(ckpt_fnames)
         batch_size = self.hparams.batch_size  
         ploader = DataLoader(dataset, collate_fn=c_collate, batch_size=batch_size, shuffle=False)
-        res = [(patient_label, torch.argmax(self.network.predict(inputs=x.float()), dim=1))
+        res = [(patient_label, torch.argmax(self.network.predict(inputs=x), dim=1))
                 for i, (x, patient_label) in tqdm(enumerate(ploader))] # classification multiclasse d'ou le argmax
         target_data, preds = map(list, zip(*res))
         target_data = to_numpy(target_data)
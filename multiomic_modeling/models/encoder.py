@@ -1,8 +1,9 @@
 import torch
 from torch import nn
+import torch.nn.functional as F
 from multiomic_modeling.models.utils.embedding import Embeddings, PositionalEncoding
 from multiomic_modeling.models.utils import init_params_xavier_uniform, init_params_xavier_normal, EncoderState
-from multiomic_modeling.data.structs import Sequence
+from multiomic_modeling.data.structs import Sequence, RaggedViews, SparseViews
 from multiomic_modeling import logging
 
 logger = logging.create_logger(__name__)
@@ -28,9 +29,14 @@ class TorchSeqTransformerEncoder(nn.Module):
 
     def forward(self, inputs) -> EncoderState:
         mask_padding_x = ~inputs[1]
-        inputs = inputs[0].float()
-        
-        x = self.embedding(inputs)
+        if isinstance(inputs[0], RaggedViews):
+            x = self.ragged_embedding(inputs[0])
+        elif isinstance(inputs[0], SparseViews):
+            x = self.sparse_embedding(inputs[0])
+        else:
+            inputs = inputs[0]
+            if inputs.dtype != self.embedding.weight.dtype: inputs = inputs.to(self.embedding.weight.dtype) # the datasets serve float32 already
+            x = self.embedding(inputs)
         x = x.transpose(0, 1)
         # x = self.pos_encoding(x) 
         # print(x.device, self.embedding.lut.weight.device)
@@ -38,3 +44,20 @@ class TorchSeqTransformerEncoder(nn.Module):
         memory = self.net(x, src_key_padding_mask=mask_padding_x)
 
         return EncoderState(memory=memory, mask_padding_x=mask_padding_x)
+
+    def ragged_embedding(self, views: RaggedViews) -> torch.Tensor:
+        """ Same as self.embedding(views.to_padded()) without multiplying the padding zeros: a view of width w only
+            meets the first w columns of the embedding weight """
+        weight = self.embedding.weight
+        data = views.data if views.dtype == weight.dtype else views.data.to(weight.dtype)
+        return torch.stack([F.linear(data[:, start:end], weight[:, :end - start], self.embedding.bias)
+                            for start, end in zip(views.offsets[:-1], views.offsets[1:])], dim=1)
+
+    def sparse_embedding(self, views: SparseViews) -> torch.Tensor:
+        """ Same as self.embedding(views.to_padded()) with a single sparse-dense matmul over the non zero values; a batch
+            denser than the density_threshold of its dataset goes through the dense nn.Linear, faster at this density """
+        weight = self.embedding.weight
+        if views.too_dense: return self.embedding(views.to_padded(nb_features=self.d_input).to(weight.dtype))
+        data = views.data if views.dtype == weight.dtype else views.data.to(weight.dtype)
+        x = torch.sparse.mm(data, weight[:, :views.nb_features].t()) + self.embedding.bias
+        return x.reshape(views.batch_size, views.nb_views, self.d_model)
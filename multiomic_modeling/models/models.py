@@ -4,6 +4,7 @@ from multiomic_modeling.models.decoder import TorchSeqTransformerDecoder, TorchS
 import torch
 import numpy as np
 from multiomic_modeling.torch_utils import to_numpy
+from multiomic_modeling.data.structs import RaggedViews, SparseViews
 torch.autograd.set_detect_anomaly(True)
 class MultiomicPredictionModel(Model):
     def __init__(self, d_input_enc, nb_classes_dec, class_weights, d_model_enc_dec=1024, d_ff_enc_dec=1024, 
@@ -79,11 +80,12 @@ class MultiomicPredictionModelMultiModal(Model):
     def compute_loss_metrics(self, preds, targets, preds_views, targets_views, mask_cible):
         
         ce_loss = self.__loss(preds, targets)
+        if isinstance(targets_views, (RaggedViews, SparseViews)): targets_views = targets_views.to_padded(nb_features=preds_views.shape[-1])
         preds_views_shape = preds_views.shape
         preds_views = preds_views.reshape(preds_views_shape[1], preds_views_shape[0], -1) 
         preds_views = preds_views * ~mask_cible.reshape(mask_cible.shape + (1,))
         targets_views = targets_views * ~mask_cible.reshape(mask_cible.shape + (1,))
-        mse_loss = torch.nn.functional.mse_loss(preds_views.float(), targets_views.float()) 
+        mse_loss = torch.nn.functional.mse_loss(preds_views, targets_views.to(preds_views.dtype)) 
         combined_loss = ce_loss + mse_loss  
         
         return {'ce': ce_loss,
@@ -24,8 +24,15 @@ def objective(trial: optuna.trial.Trial,
               dataset_views_to_consider: str, 
               data_size: int, 
               output_path: str,
-              random_seed: int) -> float:
+              random_seed: int,
+              exp_type: str = 'data_aug',
+              augmented_passes: int = None,
+              shared_memory: bool = False,
+              data_sizes: list = None) -> float:
     """ Main fonction to poptimize with Optuna """
+    if data_sizes:
+        # sweep of the number of features, served as column slices of the ranked master files
+        data_size = d_input_enc = trial.suggest_categorical("data_size", data_sizes)
     model_params = {
         "d_input_enc": int(d_input_enc), 
         "lr": trial.suggest_float("lr", 1e-4, 1e-2, log=True),
@@ -71,9 +78,12 @@ def objective(trial: optuna.trial.Trial,
         "predict_params": predict_params,
         "data_size": int(data_size),
         "dataset_views_to_consider": dataset_views_to_consider,
-        "exp_type": "data_aug",
+        "exp_type": exp_type,
         "seed": int(random_seed)
     }
+    if augmented_passes is not None: training_params["augmented_passes"] = int(augmented_passes)
+    if shared_memory: training_params["shared_memory"] = True
+    if data_sizes: training_params["ranked"] = True
 
     model = MultiomicTrainer.run_experiment(**training_params, output_path=output_path)
     # return model.trainer.callback_metrics["val_multi_acc"].item()
@@ -90,6 +100,11 @@ if __name__ == "__main__":
     parser.add_argument('-db_name', '--db_name', type=str, default='experiment_data_2000')
     parser.add_argument('-study_name', '--study_name', type=str, default='experiment_data_2000')
     parser.add_argument('-seed', '--seed', type=int, default=42)
+    parser.add_argument('-exp_type', '--exp_type', type=str, default='data_aug', choices=['data_aug', 'data_aug_batch'])
+    parser.add_argument('-aug_passes', '--augmented_passes', type=int, default=None)
+    parser.add_argument('-shm', '--shared_memory', action='store_true', help='share the views between the workers and the trials of the node')
+    parser.add_argument('-sizes', '--data_sizes', type=int, nargs='+', default=None, 
+                        help='data sizes to sweep, read from the ranked master files (overrides -s and -d)')
     args = parser.parse_args()
     assert args.d_input_enc == args.data_size, 'must be the same size'
     if os.path.exists(args.output_path): pass
@@ -108,7 +123,11 @@ if __name__ == "__main__":
                                            args.dataset_views_to_consider, 
                                            args.data_size, 
                                            args.output_path,
-                                           args.seed), 
+                                           args.seed,
+                                           args.exp_type,
+                                           args.augmented_passes,
+                                           args.shared_memory,
+                                           args.data_sizes), 
                    n_trials=100, timeout=54000, catch=(ReferenceError,)) #15h 54000 #12h 43200 #24h  86400 # add the catching of the reference error 
     
     print("Number of finished trials: {}".format(len(study.trials)))
@@ -8,9 +8,9 @@ import pandas as pd
 from tqdm import tqdm
 from argparse import Namespace
 from multiomic_modeling.models.base import BaseTrainer
-from multiomic_modeling.data.data_loader import MultiomicDatasetDataAug, MultiomicDatasetNormal, MultiomicDatasetBuilder, SubsetRandomSampler
+from multiomic_modeling.data.data_loader import MultiomicDatasetDataAug, MultiomicDatasetNormal, MultiomicDatasetBuilder, StreamingMultiomicDataset, SubsetRandomSampler
 from multiomic_modeling.models.models import MultiomicPredictionModel
-from multiomic_modeling.models.utils import expt_params_formatter, c_collate
+from multiomic_modeling.models.utils import expt_params_formatter, c_collate, c_dataloader
 from multiomic_modeling.loss_and_metrics import ClfMetrics, NumpyEncoder
 from multiomic_modeling.utilities import params_to_hash
 from multiomic_modeling.torch_utils import to_numpy, totensor, get_optimizer
@@ -64,15 +64,13 @@ class MultiomicTrainer(BaseTrainer):
     
     def train_dataloader(self):
         bs = self.hparams.batch_size
-        data_sampler = SubsetRandomSampler(np.arange(len(self._train_dataset)))
-        res = DataLoader(self._train_dataset, batch_size=bs, sampler=data_sampler, collate_fn=c_collate, num_workers=4)
+        res = c_dataloader(self._train_dataset, batch_size=bs, shuffle=True, num_workers=4)
         self.number_of_steps_per_epoch = len(res)
         return res
     
     def val_dataloader(self):
         bs = self.hparams.batch_size
-        data_sampler = SubsetRandomSampler(np.arange(len(self._valid_dataset)))
-        return DataLoader(self._valid_dataset, batch_size=bs, sampler=data_sampler, collate_fn=c_collate, num_workers=4)
+        return c_dataloader(self._valid_dataset, batch_size=bs, shuffle=True, num_workers=4)
 
     def load_average_weights(self, file_paths) -> None:
         state = {}
@@ -99,7 +97,7 @@ class MultiomicTrainer(BaseTrainer):
         ckpt_fnames = ckpt_fnames[:nb_ckpts]
         self.load_average_weights(ckpt_fnames)
         batch_size = self.hparams.batch_size  
-        ploader = DataLoader(dataset, collate_fn=c_collate, batch_size=batch_size, shuffle=False)
+        ploader = c_dataloader(dataset, batch_size=batch_size, shuffle=False)
         res = [(patient_label, torch.argmax(self.network.predict(inputs=x), dim=1))
                 for i, (x, patient_label, patient_name) in tqdm(enumerate(ploader))] # classification multiclasse d'ou le argmax
         target_data, preds = map(list, zip(*res))
@@ -156,21 +154,52 @@ class MultiomicTrainer(BaseTrainer):
             json.dump(all_params, fd, sort_keys=True, indent=2)
         # data_size = 2000; dataset_views_to_consider = 'all'; seed = 42
         if exp_type == 'normal':
-            dataset = MultiomicDatasetNormal(data_size=data_size, views_to_consider=dataset_views_to_consider)
+            dataset = MultiomicDatasetNormal(data_size=data_size, views_to_consider=dataset_views_to_consider, 
+                                             shared_memory=kwargs.get('shared_memory', False), ragged=kwargs.get('ragged', False), 
+                                             sparse=kwargs.get('sparse', False), ranked=kwargs.get('ranked', False), 
+                                             container=kwargs.get('container', False), patient_ids=True)
             train, test, valid = MultiomicDatasetBuilder().multiomic_data_normal_builder(dataset=dataset, 
                                                                                          test_size=0.2, 
                                                                                          valid_size=0.1, 
                                                                                          random_state=seed)
         elif exp_type == 'data_aug':            
-            dataset = MultiomicDatasetNormal(data_size=data_size, views_to_consider=dataset_views_to_consider)
+            dataset = MultiomicDatasetNormal(data_size=data_size, views_to_consider=dataset_views_to_consider, 
+                                             shared_memory=kwargs.get('shared_memory', False), ragged=kwargs.get('ragged', False), 
+                                             sparse=kwargs.get('sparse', False), ranked=kwargs.get('ranked', False), 
+                                             container=kwargs.get('container', False), patient_ids=True)
             train, test, valid = MultiomicDatasetBuilder().multiomic_data_normal_builder(dataset=dataset, 
                                                                                          test_size=0.2, 
                                                                                          valid_size=0.1, 
                                                                                          random_state=seed)
-            dataset_augmented = MultiomicDatasetDataAug(train_dataset=train, data_size=data_size, views_to_consider=dataset_views_to_consider)
+            dataset_augmented = MultiomicDatasetDataAug(train_dataset=train, data_size=data_size, views_to_consider=dataset_views_to_consider, 
+                                                        shared_memory=kwargs.get('shared_memory', False), ranked=kwargs.get('ranked', False), 
+                                                        container=kwargs.get('container', False), patient_ids=True)
             train = MultiomicDatasetBuilder.multiomic_data_aug_builder(augmented_dataset=dataset_augmented)
+        elif exp_type == 'data_aug_batch':
+            dataset = MultiomicDatasetNormal(data_size=data_size, views_to_consider=dataset_views_to_consider, 
+                                             shared_memory=kwargs.get('shared_memory', False), ragged=kwargs.get('ragged', False), 
+                                             sparse=kwargs.get('sparse', False), ranked=kwargs.get('ranked', False), 
+                                             container=kwargs.get('container', False), patient_ids=True)
+            train, test, valid = MultiomicDatasetBuilder().multiomic_data_normal_builder(dataset=dataset, 
+                                                                                         test_size=0.2, 
+                                                                                         valid_size=0.1, 
+                                                                                         random_state=seed)
+            train = MultiomicDatasetBuilder.multiomic_data_aug_batch_builder(train_dataset=train, 
+                                                                             augmented_passes=kwargs.get('augmented_passes'), 
+                                                                             seed=seed)
+        elif exp_type == 'out_of_core':
+            # the views stay on disk: the train patients are streamed by chunks, the valid and test ones read from the memory maps
+            dataset = MultiomicDatasetNormal(data_size=data_size, views_to_consider=dataset_views_to_consider, mmap=True, lazy_views=True, 
+                                             ragged=kwargs.get('ragged', False), ranked=kwargs.get('ranked', False), 
+                                             container=kwargs.get('container', False), patient_ids=True)
+            train, test, valid = MultiomicDatasetBuilder().multiomic_data_normal_builder(dataset=dataset, 
+                                                                                         test_size=0.2, 
+                                                                                         valid_size=0.1, 
+                                                                                         random_state=seed)
+            train = StreamingMultiomicDataset(dataset=train, batch_size=model_params.get('batch_size', 32), 
+                                              buffer_size=kwargs.get('stream_buffer_size', 2048), seed=seed)
         else: 
-            raise ValueError(f'The experiment type {exp_type} is not a valid option: choose between [normal and data_aug]')
+            raise ValueError(f'The experiment type {exp_type} is not a valid option: choose between [normal, data_aug, data_aug_batch and out_of_core]')
         logger.info("Training")
         model = MultiomicTrainer(Namespace(**model_params))
         model.fit(train_dataset=train, valid_dataset=valid, **fit_params)
@@ -2,11 +2,12 @@ import re
 import math
 import torch
 import hashlib
-from multiomic_modeling.data.structs import Sequence
+from multiomic_modeling.data.structs import Sequence, CollatedBatch, RaggedViews, SparseViews
 from multiomic_modeling.torch_utils import get_activation
 from multiomic_modeling import logging
 from torch import nn
 from torch.nn.init import xavier_uniform_, xavier_normal_
+from torch.utils.data import DataLoader, Subset, IterableDataset, BatchSampler, RandomSampler, SequentialSampler
 # from torch._six import int_classes, string_classes, container_abcs
 from torch._six import string_classes
 int_classes = int
@@ -275,6 +276,8 @@ def expt_params_formatter(all_params, key_params):
 
 def c_collate(batch):
     r"""Puts each data field into a tensor with outer dimension batch size"""
+    if isinstance(batch, CollatedBatch):
+        return batch
 
     elem = batch[0]
     elem_type = type(elem)
@@ -305,6 +308,10 @@ def c_collate(batch):
             return torch.as_tensor(batch)
     elif isinstance(elem, Sequence):
         return Sequence.collate_fn(batch)
+    elif isinstance(elem, RaggedViews):
+        return RaggedViews.collate_fn(batch)
+    elif isinstance(elem, SparseViews):
+        return SparseViews.collate_fn(batch)
     elif isinstance(elem, float):
         return torch.Tensor(batch, dtype=torch.float64)
     elif isinstance(elem, int_classes):
@@ -324,4 +331,26 @@ def c_collate(batch):
         transposed = zip(*batch)
         return [c_collate(samples) for samples in transposed]
 
-    raise TypeError(default_collate_err_msg_format.format(elem_type))
\ No newline at end of file
+    raise TypeError(default_collate_err_msg_format.format(elem_type))
+
+
+def supports_batched_fetch(dataset) -> bool:
+    """Check if the dataset (possibly wrapped in Subsets) can fetch a whole batch at once with __getitems__"""
+    while isinstance(dataset, Subset):
+        dataset = dataset.dataset
+    return hasattr(dataset, '__getitems__')
+
+
+def c_dataloader(dataset, batch_size=32, shuffle=False, num_workers=0):
+    r"""Build the DataLoader used by the trainers (training, validation and scoring).
+    If the dataset supports it, the sampler yields lists of indices and the dataset returns the collated batch
+    directly, otherwise we fall back on the per sample __getitem__ + c_collate.
+    An IterableDataset (StreamingMultiomicDataset) batches and shuffles its samples itself.
+    """
+    if isinstance(dataset, IterableDataset):
+        return DataLoader(dataset, batch_size=None, collate_fn=c_collate, num_workers=num_workers)
+    sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+    if supports_batched_fetch(dataset):
+        return DataLoader(dataset, sampler=BatchSampler(sampler, batch_size=batch_size, drop_last=False),
+                          batch_size=None, collate_fn=c_collate, num_workers=num_workers)
+    return DataLoader(dataset, sampler=sampler, batch_size=batch_size, collate_fn=c_collate, num_workers=num_workers)